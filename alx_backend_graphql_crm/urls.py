@@ -1,7 +1,19 @@
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
+from crm.views import (
+    AsyncCRMGraphQLView,
+    CRMGraphQLView,
+    document_cache_stats,
+    export_view,
+    metrics_view,
+)
+
 urlpatterns = [
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql", csrf_exempt(CRMGraphQLView.as_view(graphiql=True))),
+    # Async endpoint; serve it through asgi.py to get concurrent resolvers.
+    path("graphql/async", AsyncCRMGraphQLView.as_view()),
+    path("graphql/document-cache", document_cache_stats),
+    path("metrics", metrics_view),
+    path("export/<str:kind>.<str:fmt>", export_view),
 ]
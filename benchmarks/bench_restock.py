@@ -0,0 +1,54 @@
+"""Compare the per-row restock loop with ``ProductQuerySet.restock_below``.
+
+Usage: python -m benchmarks.bench_restock [--products 10000]
+"""
+
+import argparse
+
+from benchmarks.support import measure, test_database
+
+from crm.models import Product
+
+THRESHOLD = 10
+AMOUNT = 10
+
+
+def seed(count):
+    Product.objects.all().delete()
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price="1.00", stock=i % (2 * THRESHOLD))
+        for i in range(count)
+    )
+
+
+def restock_per_row():
+    # The loop UpdateLowStockProducts.mutate used before the bulk path.
+    updated = []
+    for product in Product.objects.filter(stock__lt=THRESHOLD):
+        product.stock += AMOUNT
+        product.save()
+        updated.append(f"{product.name} ({product.stock})")
+    return updated
+
+
+def restock_bulk():
+    return Product.objects.restock_below(THRESHOLD, AMOUNT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with test_database():
+        for label, func in (("per-row save", restock_per_row), ("bulk", restock_bulk)):
+            seed(args.products)
+            updated, seconds, queries = measure(func)
+            print(
+                f"{label:>12}: {len(updated)} restocked in {seconds * 1000:.1f} ms "
+                f"using {queries} queries"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Concurrent read/write throughput on SQLite with and without the tuning profile.
+
+Usage: python -m benchmarks.bench_sqlite_concurrency [--readers 4] [--writers 2]
+    [--seconds 5]
+
+The "defaults" profile uses SQLite's PRAGMAs and deferred transactions,
+"tuned" the PRAGMAs from ``crm.sqlite`` and ``BEGIN IMMEDIATE`` transactions
+(``crm.backends.sqlite3``). Each profile gets a fresh database file.
+Writer threads create one order at a time through ``crm.bulk.create_orders``
+(as the bulk mutation does); reader threads fetch the latest orders and the
+dashboard counters. Operations that fail with ``database is locked`` are
+counted, not retried.
+"""
+
+import argparse
+import random
+import threading
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from benchmarks.support import test_database
+
+from django.db import OperationalError, connection, connections
+from django.test import override_settings
+
+from crm.bulk import create_orders
+from crm.models import Customer, Order, Product
+from crm.sqlite import DEFAULT_PRAGMAS
+from crm.stats import get_stats
+
+PROFILES = (
+    ("defaults", {}, "DEFERRED"),
+    ("tuned", DEFAULT_PRAGMAS, "IMMEDIATE"),
+)
+CUSTOMERS = 200
+PRODUCTS = 50
+
+
+def seed():
+    Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com")
+        for i in range(CUSTOMERS)
+    )
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price="9.99", stock=10**9) for i in range(PRODUCTS)
+    )
+    return (
+        list(Customer.objects.values_list("pk", flat=True)),
+        list(Product.objects.values_list("pk", flat=True)),
+    )
+
+
+def write(customer_ids, product_ids):
+    create_orders(
+        [
+            {
+                "customer_id": random.choice(customer_ids),
+                "items": [{"product_id": random.choice(product_ids), "quantity": 1}],
+            }
+        ]
+    )
+
+
+def read(customer_ids, product_ids):
+    list(Order.objects.select_related("customer").order_by("-id")[:20])
+    get_stats()
+
+
+class Counts:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = {"read": 0, "write": 0}
+        self.locked = {"read": 0, "write": 0}
+
+    def add(self, kind, done, locked):
+        with self.lock:
+            self.done[kind] += done
+            self.locked[kind] += locked
+
+
+def worker(kind, operation, ids, deadline, counts):
+    done = locked = 0
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                operation(*ids)
+                done += 1
+            except OperationalError as error:
+                if "locked" not in str(error):
+                    raise
+                locked += 1
+    finally:
+        counts.add(kind, done, locked)
+        connections.close_all()
+
+
+def run(pragmas, transaction_mode, readers, writers, seconds):
+    # Shared with the connections the worker threads open.
+    connection.settings_dict["OPTIONS"]["transaction_mode"] = transaction_mode
+    with TemporaryDirectory() as directory, override_settings(SQLITE_PRAGMAS=pragmas):
+        with test_database(Path(directory) / "bench.sqlite3"):
+            ids = seed()
+            counts = Counts()
+            deadline = time.perf_counter() + seconds
+            threads = [
+                threading.Thread(
+                    target=worker, args=(kind, operation, ids, deadline, counts)
+                )
+                for kind, operation, count in (
+                    ("read", read, readers),
+                    ("write", write, writers),
+                )
+                for _ in range(count)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for label, pragmas, transaction_mode in PROFILES:
+        counts = run(
+            pragmas, transaction_mode, args.readers, args.writers, args.seconds
+        )
+        print(
+            f"{label:>8}: "
+            f"{counts.done['read'] / args.seconds:8.1f} reads/s, "
+            f"{counts.done['write'] / args.seconds:7.1f} writes/s, "
+            f"locked: {counts.locked['read']} reads, {counts.locked['write']} writes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Benchmark GraphQL queries and scheduled jobs against seeded data.
+
+Usage: python -m benchmarks.run [--customers 2000] [--products 200]
+    [--orders 10000] [--repeat 20] [--scenario NAME ...]
+    [--output results.json] [--baseline previous.json] [--tolerance 0.2]
+
+Data comes from ``crm.seeding`` in a throwaway test database. Each
+scenario runs ``--warmup`` untimed and ``--repeat`` timed iterations, each
+inside a transaction that is rolled back, so the jobs that write see the
+same data every time (and commits don't cost an fsync). A last iteration
+runs under ``tracemalloc`` for peak Python memory.
+
+The JSON report holds latency percentiles, the SQL query count and peak
+memory per scenario. With ``--baseline`` the run is compared to an earlier
+report: a p50/p95 latency or memory more than ``--tolerance`` above it, or
+any extra query, is a regression and the exit status is 1.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from benchmarks.support import measure, test_database
+
+import django
+from django.db import connection, transaction
+
+from crm.cleanup import delete_inactive_customers
+from crm.loaders import Loaders
+from crm.reminders import send_reminders
+from crm.schema import schema
+from crm.seeding import seed
+
+ORDERS_QUERY = """
+    query {
+        orders(days: 7, first: 100) {
+            edges { node { id orderDate customer { name } products { name } } }
+        }
+    }
+"""
+COUNTERS_QUERY = "query { totalCustomers totalOrders totalRevenue }"
+RESTOCK_MUTATION = """
+    mutation {
+        updateLowStockProducts(threshold: 10, restockAmount: 10) {
+            success
+            updatedProducts
+        }
+    }
+"""
+PERCENTILES = (50, 90, 95, 99)
+
+
+def execute(document):
+    result = schema.execute(document, context_value=SimpleNamespace(loaders=Loaders()))
+    if result.errors:
+        raise RuntimeError("; ".join(str(error) for error in result.errors))
+    return result.data
+
+
+def cleanup():
+    return list(delete_inactive_customers(days=365))
+
+
+def reminders():
+    return list(send_reminders(lambda order: None, days=7, transport="local"))
+
+
+SCENARIOS = {
+    "orders": lambda: execute(ORDERS_QUERY),
+    "counters": lambda: execute(COUNTERS_QUERY),
+    "restock": lambda: execute(RESTOCK_MUTATION),
+    "cleanup": cleanup,
+    "reminders": reminders,
+}
+
+
+def rolled_back(func):
+    """Run ``func`` in a transaction that is rolled back afterwards."""
+    with transaction.atomic():
+        result = func()
+        transaction.set_rollback(True)
+    return result
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted ``values``."""
+    rank = max(1, -(-pct * len(values) // 100))
+    return values[rank - 1]
+
+
+def run_scenario(func, repeat, warmup):
+    for _ in range(warmup):
+        rolled_back(func)
+    timings, queries = [], []
+    for _ in range(repeat):
+        _, seconds, count = rolled_back(lambda: measure(func))
+        timings.append(seconds * 1000)
+        queries.append(count)
+
+    tracemalloc.start()
+    try:
+        rolled_back(func)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    latency = {
+        "min": timings[0],
+        **{f"p{pct}": percentile(timings, pct) for pct in PERCENTILES},
+        "max": timings[-1],
+        "mean": sum(timings) / len(timings),
+    }
+    return {
+        "iterations": repeat,
+        "latency_ms": {key: round(value, 3) for key, value in latency.items()},
+        "queries": max(queries),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Yield a message per metric that got worse than ``baseline``."""
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for key in ("p50", "p95"):
+            now, before = current["latency_ms"][key], previous["latency_ms"][key]
+            if now > before * (1 + tolerance):
+                yield f"{name}: {key} latency {before:.1f} -> {now:.1f} ms"
+        if current["queries"] > previous["queries"]:
+            yield f"{name}: queries {previous['queries']} -> {current['queries']}"
+        now, before = current["peak_memory_kib"], previous["peak_memory_kib"]
+        if now > before * (1 + tolerance):
+            yield f"{name}: peak memory {before:.0f} -> {now:.0f} KiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument(
+        "--scenario", action="append", choices=tuple(SCENARIOS), dest="scenarios"
+    )
+    parser.add_argument("--output", help="Write the JSON report here, not stdout.")
+    parser.add_argument("--baseline", help="A previous JSON report to compare to.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "seed": {
+                "customers": args.customers,
+                "products": args.products,
+                "orders": args.orders,
+                "seed": args.seed,
+            },
+        },
+        "scenarios": {},
+    }
+    with test_database():
+        seed(
+            customers=args.customers,
+            products=args.products,
+            orders=args.orders,
+            seed=args.seed,
+        )
+        for name in args.scenarios or SCENARIOS:
+            results["scenarios"][name] = run_scenario(
+                SCENARIOS[name], args.repeat, args.warmup
+            )
+            print(f"{name}: done", file=sys.stderr)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = list(regressions(results, baseline, args.tolerance))
+        for message in found:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway test database created from the
+project's migrations, so they never touch ``db.sqlite3``.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+
+@contextmanager
+def test_database(path=None):
+    """Create the test database; in memory, or in the file ``path`` on SQLite.
+
+    A file is needed for benchmarks that open several connections.
+    """
+    old_name = connection.settings_dict["NAME"]
+    if path is not None:
+        connection.settings_dict["TEST"]["NAME"] = str(path)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, *args, **kwargs):
+    """Run ``func`` once; return ``(result, seconds, query_count)``."""
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return result, elapsed, len(ctx.captured_queries)
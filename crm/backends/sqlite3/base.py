@@ -0,0 +1,34 @@
+"""SQLite backend with a configurable transaction mode.
+
+``OPTIONS["transaction_mode"] = "IMMEDIATE"`` makes ``atomic()`` take the
+write lock when the transaction starts. With the default ``DEFERRED`` mode
+a transaction that reads before it writes has to upgrade its lock midway,
+and when another connection wrote in between SQLite fails it at once with
+``database is locked``, whatever the busy timeout. Django 5.1 has the same
+option built in; this backend can be dropped after upgrading.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ("DEFERRED", "EXCLUSIVE", "IMMEDIATE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        mode = params.pop("transaction_mode", None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}."
+            )
+        self.transaction_mode = mode and mode.upper()
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute("BEGIN")
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
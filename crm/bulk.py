@@ -0,0 +1,252 @@
+"""High-throughput write paths used by the bulk mutations and import jobs.
+
+These use ``bulk_create``/``update`` and therefore skip model signals; each
+function applies the side effects those signals would have (dashboard
+counters, stock, search entries, cached responses) itself.
+"""
+
+from collections import Counter
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from crm import response_cache, search, stats
+from crm.models import Customer, Order, OrderItem, Product, SearchEntry
+
+
+class RowError(Exception):
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+def create_orders(entries):
+    """Create many orders with their items in one transaction.
+
+    ``entries`` is a sequence of ``{"customer_id": ..., "items": [{"product_id":
+    ..., "quantity": ...}]}``. Customers and products are fetched with one
+    query each, orders and items are inserted with ``bulk_create`` and stock
+    is decremented with a single ``UPDATE``. Invalid entries are skipped and
+    reported; returns ``(orders, errors)``.
+    """
+    errors = []
+    lines = []
+    for index, entry in enumerate(entries):
+        try:
+            customer_id = parse_pk(index, "customer", entry["customer_id"])
+            lines.append((index, customer_id, parse_items(index, entry)))
+        except RowError as error:
+            errors.append(error)
+
+    customer_ids = {customer_id for _, customer_id, _ in lines}
+    product_ids = {pk for _, _, items in lines for pk in items}
+
+    with transaction.atomic():
+        known_customers = dict(
+            Customer.objects.filter(pk__in=customer_ids).values_list("pk", "name")
+        )
+        # Lock the rows so concurrent orders can't oversell the same stock.
+        products = Product.objects.select_for_update().in_bulk(product_ids)
+        stock = {pk: product.stock for pk, product in products.items()}
+
+        orders, items, order_products = [], [], []
+        for index, customer_id, quantities in lines:
+            try:
+                check_order(index, customer_id, quantities, known_customers, stock)
+            except RowError as error:
+                errors.append(error)
+                continue
+            for pk, quantity in quantities.items():
+                stock[pk] -= quantity
+            order = Order(
+                customer_id=customer_id,
+                total_amount=sum(
+                    (
+                        products[pk].price * quantity
+                        for pk, quantity in quantities.items()
+                    ),
+                    Decimal("0"),
+                ),
+            )
+            orders.append(order)
+            order_products.append(list(quantities))
+            items.extend(
+                OrderItem(
+                    order=order,
+                    product_id=pk,
+                    quantity=quantity,
+                    unit_price=products[pk].price,
+                )
+                for pk, quantity in quantities.items()
+            )
+
+        if orders:
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(items)
+            search.write(
+                SearchEntry.ORDER,
+                {
+                    order.pk: search.order_text(
+                        order.pk,
+                        known_customers[order.customer_id],
+                        [products[pk].name for pk in pks],
+                    )
+                    for order, pks in zip(orders, order_products)
+                },
+            )
+            decrement_stock(
+                {pk: products[pk].stock - left for pk, left in stock.items()}
+            )
+            stats.adjust(
+                orders=len(orders),
+                revenue=sum((order.total_amount for order in orders), Decimal("0")),
+            )
+            response_cache.bump(Order)
+
+    errors.sort(key=lambda error: error.index)
+    return orders, errors
+
+
+def create_customers(rows, start=0):
+    """Insert one chunk of customer rows; return ``(created, errors)``.
+
+    ``rows`` are dicts with ``name``, ``email`` and optional ``phone``; error
+    indexes count from ``start``. Emails are deduplicated within the chunk
+    in memory and against the database with a single ``IN`` lookup. If a
+    concurrent import takes one of the emails before the insert, the chunk
+    is retried row by row and the rows that lost are reported, so counters
+    and search only see customers this call created.
+    """
+    errors = []
+    candidates = {}
+    for index, row in enumerate(rows, start):
+        try:
+            customer = build_customer(index, row)
+        except RowError as error:
+            errors.append(error)
+            continue
+        if customer.email in candidates:
+            errors.append(RowError(index, f"Duplicate email {customer.email}."))
+            continue
+        candidates[customer.email] = (index, customer)
+
+    existing = set(
+        Customer.objects.filter(email__in=candidates).values_list("email", flat=True)
+    )
+    pending = []
+    for email, (index, customer) in candidates.items():
+        if email in existing:
+            errors.append(RowError(index, f"Email {email} already exists."))
+        else:
+            pending.append((index, customer))
+
+    with transaction.atomic():
+        created = insert_customers(pending, errors)
+        stats.adjust(customers=len(created))
+        response_cache.bump(Customer)
+        search.index_customers(created)
+
+    errors.sort(key=lambda error: error.index)
+    return created, errors
+
+
+def insert_customers(pending, errors):
+    """Insert ``(index, customer)`` pairs; return the customers inserted."""
+    customers = [customer for _, customer in pending]
+    try:
+        with transaction.atomic():
+            return Customer.objects.bulk_create(customers)
+    except IntegrityError:
+        pass
+    # Another import claimed some emails since the lookup: find out which.
+    created = []
+    for index, customer in pending:
+        try:
+            with transaction.atomic():
+                Customer.objects.bulk_create([customer])
+        except IntegrityError:
+            errors.append(RowError(index, f"Email {customer.email} already exists."))
+        else:
+            created.append(customer)
+    return created
+
+
+def build_customer(index, row):
+    if not isinstance(row, dict):
+        raise RowError(index, "Invalid record.")
+    name = customer_text(index, row, "name")
+    email = customer_text(index, row, "email")
+    phone = customer_text(index, row, "phone") or None
+    if not name:
+        raise RowError(index, "Name is required.")
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError(index, f"Invalid email {email!r}.")
+    return Customer(name=name, email=email, phone=phone)
+
+
+def customer_text(index, row, field):
+    """``row[field]`` stripped, ``""`` when missing; must fit the column."""
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise RowError(index, f"{field.capitalize()} must be a string.")
+    value = value.strip()
+    max_length = Customer._meta.get_field(field).max_length
+    if len(value) > max_length:
+        raise RowError(
+            index, f"{field.capitalize()} must be at most {max_length} characters."
+        )
+    return value
+
+
+def parse_pk(index, label, value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(index, f"Invalid {label} id: {value!r}.")
+
+
+def parse_items(index, entry):
+    quantities = Counter()
+    for item in entry["items"]:
+        quantity = item.get("quantity", 1)
+        if not isinstance(quantity, int) or isinstance(quantity, bool):
+            raise RowError(index, f"Invalid quantity: {quantity!r}.")
+        if quantity < 1:
+            raise RowError(index, "Quantity must be at least 1.")
+        quantities[parse_pk(index, "product", item["product_id"])] += quantity
+    if not quantities:
+        raise RowError(index, "An order needs at least one item.")
+    return quantities
+
+
+def check_order(index, customer_id, quantities, known_customers, stock):
+    if customer_id not in known_customers:
+        raise RowError(index, f"Customer {customer_id} does not exist.")
+    for pk, quantity in quantities.items():
+        if pk not in stock:
+            raise RowError(index, f"Product {pk} does not exist.")
+        if stock[pk] < quantity:
+            raise RowError(index, f"Not enough stock for product {pk}.")
+
+
+def decrement_stock(quantities):
+    """Subtract ``{product_pk: quantity}`` from stock in one UPDATE."""
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(
+        stock=F("stock")
+        - Case(
+            *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+            output_field=IntegerField(),
+        )
+    )
+    response_cache.bump(Product)
@@ -0,0 +1,97 @@
+"""Batched deletion of customers who stopped ordering.
+
+A customer is inactive when they have orders and the latest one is older
+than the cutoff. Candidates are found with one aggregated query per batch
+and deleted, with their orders, in a short transaction of their own, so
+no lock is held for the whole run.
+"""
+
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from crm import response_cache, rollups, search, stats
+from crm.models import Customer, Order, SearchEntry
+from crm.signals import muted
+
+DEFAULT_DAYS = 365
+DEFAULT_BATCH_SIZE = 500
+
+
+class Batch:
+    __slots__ = ("customers", "orders", "revenue", "duration")
+
+    def __init__(self, customers, orders, revenue, duration):
+        self.customers = customers
+        self.orders = orders
+        self.revenue = revenue
+        self.duration = duration
+
+
+def inactive_customers(cutoff):
+    return Customer.objects.annotate(last_order=Max("order__order_date")).filter(
+        last_order__lt=cutoff
+    )
+
+
+def delete_inactive_customers(
+    days=DEFAULT_DAYS, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, pause=0
+):
+    """Delete inactive customers in batches, yielding a ``Batch`` for each.
+
+    With ``dry_run`` nothing is deleted and the batches report what would
+    be. ``pause`` sleeps that many seconds between batches to leave room
+    for other writers.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    last_pk = 0
+    while True:
+        start = time.perf_counter()
+        with transaction.atomic():
+            ids = list(
+                inactive_customers(cutoff)
+                .filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            last_pk = ids[-1]
+            if not dry_run:
+                # Lock the batch and drop anyone who ordered since it was read.
+                ids = list(
+                    Customer.objects.select_for_update()
+                    .filter(pk__in=ids)
+                    .exclude(order__order_date__gte=cutoff)
+                    .values_list("pk", flat=True)
+                )
+            batch = delete_batch(ids, dry_run)
+        batch.duration = time.perf_counter() - start
+        yield batch
+        if pause:
+            time.sleep(pause)
+
+
+def delete_batch(ids, dry_run):
+    orders = Order.objects.filter(customer_id__in=ids)
+    totals = orders.aggregate(count=Count("pk"), revenue=Sum("total_amount"))
+    batch = Batch(len(ids), totals["count"], totals["revenue"] or 0, None)
+    if dry_run or not ids:
+        return batch
+
+    order_ids = list(orders.values_list("pk", flat=True))
+    rollups.mark_stale(rollups.order_days(orders))
+    # The per-row handlers would update the counters and search index once
+    # per deleted row; apply the batch's changes in one go instead.
+    with muted():
+        Customer.objects.filter(pk__in=ids).delete()
+    stats.adjust(
+        customers=-batch.customers, orders=-batch.orders, revenue=-batch.revenue
+    )
+    search.unindex(SearchEntry.CUSTOMER, ids)
+    search.unindex(SearchEntry.ORDER, order_ids)
+    response_cache.bump(Customer, Order)
+    return batch
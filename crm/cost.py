@@ -0,0 +1,158 @@
+"""Static query cost and depth analysis.
+
+Costs are computed from the document alone, before execution:
+
+* object-typed fields cost 1 and scalars 0, unless ``GRAPHQL_FIELD_COSTS``
+  overrides a ``"Type.field"`` entry;
+* a field taking ``first`` multiplies the cost of its selection by the page
+  size it asks for (the default page size when omitted, ``MAX_PAGE_SIZE``
+  when it is a variable, since the value is unknown at validation time);
+* other list fields multiply their own cost and their selection by
+  ``GRAPHQL_LIST_COST_FACTOR``, the assumed number of items.
+
+``CostLimitRule`` rejects operations above ``GRAPHQL_MAX_QUERY_COST`` or
+deeper than ``GRAPHQL_MAX_QUERY_DEPTH``.
+"""
+
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    IntValueNode,
+    ValidationRule,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+)
+
+from crm.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def page_size(node, field):
+    """Return the page size a paginated field will return, else ``None``."""
+    if "first" not in field.args:
+        return None
+    for argument in node.arguments:
+        if argument.name.value == "first":
+            if isinstance(argument.value, IntValueNode):
+                # Out-of-range values fail at execution; clamp so a negative
+                # page can't offset the cost of its siblings.
+                return min(max(int(argument.value.value), 0), MAX_PAGE_SIZE)
+            return MAX_PAGE_SIZE
+    return DEFAULT_PAGE_SIZE
+
+
+class CostAnalysis:
+    def __init__(self, schema, fragments):
+        self.schema = schema
+        self.fragments = fragments
+        self.field_costs = setting("GRAPHQL_FIELD_COSTS", {})
+        self.list_factor = setting("GRAPHQL_LIST_COST_FACTOR", 10)
+        # Fragment cycles are reported by another rule in the same pass, so
+        # guard against them here instead of recursing forever.
+        self.visiting = set()
+
+    def selection_cost(self, parent_type, selection_set, depth, paged=False):
+        """Return ``(cost, depth)`` for ``selection_set`` on ``parent_type``."""
+        cost, max_depth = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field_cost(
+                    parent_type, selection, depth + 1, paged
+                )
+            else:
+                name = None
+                if isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.fragments.get(name)
+                    if fragment is None or name in self.visiting:
+                        continue
+                    self.visiting.add(name)
+                else:
+                    fragment = selection
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = self.schema.get_type(
+                        fragment.type_condition.name.value
+                    )
+                field_cost, field_depth = self.selection_cost(
+                    fragment_type, fragment.selection_set, depth, paged
+                )
+                self.visiting.discard(name)
+            cost += field_cost
+            max_depth = max(max_depth, field_depth)
+        return cost, max_depth
+
+    def field_cost(self, parent_type, node, depth, paged):
+        name = node.name.value
+        if name.startswith("__"):
+            return 0, depth
+
+        field = getattr(parent_type, "fields", {}).get(name)
+        if field is None:
+            return 0, depth
+
+        named_type = get_named_type(field.type)
+        default = 0 if is_leaf_type(named_type) else 1
+        cost = self.field_costs.get(f"{parent_type.name}.{name}", default)
+        if node.selection_set is None:
+            return cost, depth
+
+        first = page_size(node, field)
+        if first is not None:
+            # The page size applies below the connection, to its ``edges``.
+            child_cost, child_depth = self.selection_cost(
+                named_type, node.selection_set, depth, paged=True
+            )
+            return cost + first * child_cost, child_depth
+
+        child_cost, child_depth = self.selection_cost(
+            named_type, node.selection_set, depth
+        )
+        if isinstance(get_nullable_type(field.type), GraphQLList) and not paged:
+            # Every item of a plain list pays for itself and its selection.
+            return self.list_factor * (cost + child_cost), child_depth
+        return cost + child_cost, child_depth
+
+
+def operation_cost(schema, document, operation):
+    """Return ``(cost, depth)`` for ``operation`` in ``document``."""
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == "fragment_definition"
+    }
+    root_type = schema.get_root_type(operation.operation)
+    if root_type is None:
+        return 0, 0
+    return CostAnalysis(schema, fragments).selection_cost(
+        root_type, operation.selection_set, 0
+    )
+
+
+class CostLimitRule(ValidationRule):
+    def enter_operation_definition(self, node, *args):
+        context = self.context
+        cost, depth = operation_cost(context.schema, context.document, node)
+
+        max_depth = setting("GRAPHQL_MAX_QUERY_DEPTH", 10)
+        if depth > max_depth:
+            self.report_error(
+                GraphQLError(
+                    f"Query depth {depth} exceeds the maximum of {max_depth}.", node
+                )
+            )
+
+        max_cost = setting("GRAPHQL_MAX_QUERY_COST", 5000)
+        if cost > max_cost:
+            self.report_error(
+                GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of {max_cost}.", node
+                )
+            )
@@ -1,12 +1,13 @@
-import os
 from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+
+from crm.graphql_client import execute
+
+HEARTBEAT_LOG_FILE = "/tmp/crm_heartbeat_log.txt"
+LOW_STOCK_LOG_FILE = "/tmp/low_stock_updates_log.txt"
 
 
 def log_crm_heartbeat():
     """Logs a heartbeat message and optionally checks GraphQL endpoint"""
-    log_file = "/tmp/crm_heartbeat_log.txt"
     timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
 
     # Basic heartbeat log
@@ -14,14 +15,7 @@ def log_crm_heartbeat():
 
     try:
         # Optional GraphQL health check
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=2,
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        query = gql("""query { hello }""")
-        result = client.execute(query)
+        result = execute("""query { hello }""")
 
         if result.get("hello"):
             message += f"{timestamp} GraphQL endpoint responsive: {result['hello']}\n"
@@ -32,25 +26,17 @@ def log_crm_heartbeat():
         message += f"{timestamp} GraphQL check error: {str(e)}\n"
 
     # Write to log file
-    with open(log_file, "a") as f:
+    with open(HEARTBEAT_LOG_FILE, "a") as f:
         f.write(message)
 
 
 def update_low_stock():
-    LOG_FILE = "/tmp/low_stock_updates_log.txt"
-
     def log(message):
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(LOG_FILE, "a") as f:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(LOW_STOCK_LOG_FILE, "a") as f:
             f.write(f"{timestamp} - {message}\n")
 
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql", verify=True, retries=3
-    )
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-
-    mutation = gql(
-        """
+    mutation = """
         mutation {
             updateLowStockProducts {
                 success
@@ -59,10 +45,9 @@ def update_low_stock():
             }
         }
     """
-    )
 
     try:
-        result = client.execute(mutation)
+        result = execute(mutation)
         data = result["updateLowStockProducts"]
         log(f"{data['message']} | Products: {', '.join(data['updatedProducts'])}")
         print("Low stock update successful.")
@@ -2,7 +2,7 @@
 
 # Get the directory where the script resides
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-DJANGO_DIR="$(cd "$SCRIPT_DIR/.." && cwd)"
+DJANGO_DIR="$(cd "$SCRIPT_DIR/../.." && pwd)"
 
 # Log file
 LOG_FILE="/tmp/customer_cleanup_log.txt"
@@ -17,28 +17,16 @@ else
   echo "[$TIMESTAMP] Found manage.py in $DJANGO_DIR" >> "$LOG_FILE"
 fi
 
-# Run the Django shell to delete inactive customers
+# Delete inactive customers in short batches
 cd "$DJANGO_DIR" || {
   echo "[$TIMESTAMP] ERROR: Failed to change directory to $DJANGO_DIR" >> "$LOG_FILE"
   exit 1
 }
 
-./manage.py shell << EOF >> "$LOG_FILE" 2>&1
-from django.utils import timezone
-from datetime import timedelta
-from crm.models import Customer
-
-cutoff_date = timezone.now() - timedelta(days=365)
-inactive_customers = Customer.objects.filter(
-    last_order_date__lt=cutoff_date,
-    orders__isnull=False
-).distinct()
-
-count = inactive_customers.count()
-inactive_customers.delete()
-
-print(f"Deleted {count} inactive customers")
-EOF
+if ! ./manage.py cleanup_inactive_customers --days 365 --batch-size 500 --pause 0.1 >> "$LOG_FILE" 2>&1; then
+  echo "[$(date +"%Y-%m-%d %H:%M:%S")] ERROR: Cleanup failed" >> "$LOG_FILE"
+  exit 1
+fi
 
 TIMESTAMP=$(date +"%Y-%m-%d %H:%M:%S")
 echo "[$TIMESTAMP] Cleanup completed" >> "$LOG_FILE"
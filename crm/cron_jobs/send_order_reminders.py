@@ -1,64 +1,57 @@
 #!/usr/bin/env python3
 import os
 import sys
-from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import threading
+from datetime import datetime
 
-# Configure GraphQL client
-transport = RequestsHTTPTransport(
-    url="http://localhost:8000/graphql",
-    verify=True,
-    retries=3,
-)
+import django
 
-client = Client(transport=transport, fetch_schema_from_transport=True)
+# Run against the project in-process instead of our own HTTP endpoint
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+django.setup()
 
-# GraphQL query to find recent pending orders
-query = gql(
-    """
-    query GetRecentOrders {
-        orders(where: {
-            order_date_gte: "${week_ago}",
-            status: "pending"
-        }) {
-            id
-            customer {
-                email
-            }
-        }
-    }
-"""
-)
+from crm.reminders import send_reminders  # noqa: E402
 
+LOG_FILE = "/tmp/order_reminders_log.txt"
 
-def main():
-    # Calculate date 7 days ago
-    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-
-    try:
-        # Execute query with parameter
-        result = client.execute(query, variable_values={"week_ago": week_ago})
-
-        # Prepare log entry
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] Processing order reminders\n"
-
-        # Process orders and build log
-        for order in result["orders"]:
-            log_entry += f"Order ID: {order['id']}, Customer Email: {order['customer']['email']}\n"
 
-        # Write to log file
-        with open("/tmp/order_reminders_log.txt", "a") as log_file:
-            log_file.write(log_entry)
-
-        print("Order reminders processed!")
-
-    except Exception as e:
-        error_msg = f"[{timestamp}] Error: {str(e)}\n"
-        with open("/tmp/order_reminders_log.txt", "a") as log_file:
-            log_file.write(error_msg)
-        sys.exit(1)
+def main():
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    lock = threading.Lock()
+
+    with open(LOG_FILE, "a") as log_file:
+
+        def log(line):
+            with lock:
+                log_file.write(line + "\n")
+                log_file.flush()
+
+        def notify(order):
+            log(
+                f"Order ID: {order['id']}, Customer Email: {order['customer']['email']}"
+            )
+
+        log(f"[{timestamp}] Processing order reminders")
+        sent = skipped = failed = 0
+        try:
+            for page in send_reminders(notify):
+                sent += len(page.sent)
+                skipped += page.skipped
+                failed += len(page.failed)
+                for order, error in page.failed:
+                    log(f"Order ID: {order['id']}, reminder failed: {error}")
+        except Exception as e:
+            log(f"[{timestamp}] Error: {e}")
+            sys.exit(1)
+
+        log(
+            f"[{timestamp}] Reminders: {sent} sent, {skipped} already sent, "
+            f"{failed} failed"
+        )
+
+    print("Order reminders processed!")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,273 @@
+"""Execute GraphQL documents for scheduled jobs.
+
+By default documents run in-process against ``crm.schema.schema``, which
+skips the HTTP hop, the introspection query and the web worker slot that a
+request to our own endpoint would cost. Set ``CRM_GRAPHQL_TRANSPORT =
+"http"`` (or pass ``transport="http"``) to go through ``CRM_GRAPHQL_URL``
+instead, e.g. when the job runs on a host without database access.
+
+Over HTTP every process shares one ``HTTPClient`` per URL: a keep-alive
+``requests`` session, a schema fetched once and reused to validate
+documents locally, retries with exponential backoff and full jitter, and a
+circuit breaker that fails fast while the API is down instead of letting
+every worker pile more requests onto it. Queries are retried after any
+outage; mutations only when the request never reached the server, since
+after a timeout or a 5xx the server may already have applied them.
+"""
+
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from graphql import OperationDefinitionNode, OperationType
+from urllib3.exceptions import NewConnectionError
+
+from crm.loaders import Loaders
+
+DEFAULT_URL = "http://localhost:8000/graphql"
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_BACKOFF_MAX = 10.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30.0
+POOL_SIZE = 10
+
+
+class GraphQLClientError(Exception):
+    pass
+
+
+class CircuitOpenError(GraphQLClientError):
+    pass
+
+
+def execute(document, variables=None, transport=None):
+    """Run ``document`` and return its ``data``; raise on GraphQL errors."""
+    transport = transport or getattr(settings, "CRM_GRAPHQL_TRANSPORT", "local")
+    if transport == "local":
+        return execute_local(document, variables)
+    if transport == "http":
+        return execute_http(document, variables)
+    raise ValueError(f"Unknown GraphQL transport: {transport!r}")
+
+
+def execute_local(document, variables=None):
+    from crm.schema import schema
+
+    result = schema.execute(
+        document,
+        variable_values=variables,
+        context_value=SimpleNamespace(loaders=Loaders()),
+    )
+    if result.errors:
+        raise GraphQLClientError("; ".join(str(error) for error in result.errors))
+    return result.data
+
+
+def execute_http(document, variables=None):
+    return get_client().execute(document, variables)
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while.
+
+    After ``threshold`` consecutive failures the circuit opens and calls
+    fail immediately. Once ``reset_timeout`` seconds have passed a single
+    trial call is let through: success closes the circuit, failure opens
+    it again for another ``reset_timeout``.
+    """
+
+    def __init__(self, threshold, reset_timeout, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` or let the call through.
+
+        Returns ``True`` when the call is the half-open trial; the caller
+        must then end it with ``record_success``, ``record_failure`` or
+        ``release_trial``.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.reset_timeout - (self.clock() - self.opened_at)
+            if remaining > 0 or self.trial:
+                raise CircuitOpenError(
+                    f"GraphQL API unavailable; retrying in {max(remaining, 0):.0f}s."
+                )
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self.trial = False
+
+    def release_trial(self):
+        # The trial ended without telling whether the API is up (e.g. the
+        # document failed to validate); let the next call try again.
+        with self.lock:
+            self.trial = False
+
+
+def is_retryable(error):
+    """Whether ``error`` is an outage worth retrying, not a bad request."""
+    from gql.transport.exceptions import TransportServerError
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, TransportServerError):
+        return error.code is None or error.code == 429 or error.code >= 500
+    return False
+
+
+def never_sent(error):
+    """Whether ``error`` happened before the request reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def is_mutation(document):
+    return any(
+        isinstance(definition, OperationDefinitionNode)
+        and definition.operation == OperationType.MUTATION
+        for definition in document.definitions
+    )
+
+
+def backoff_delay(attempt, base, cap):
+    """Full jitter: a random delay up to ``base * 2 ** attempt``, capped."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+@lru_cache(maxsize=128)
+def parse(document):
+    from gql import gql
+
+    return gql(document)
+
+
+class HTTPClient:
+    def __init__(self, url, timeout, retries, backoff, backoff_max, breaker):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+        self.lock = threading.Lock()
+        self.session = None
+
+    def connect(self):
+        """Open the shared session once; the first call fetches the schema."""
+        with self.lock:
+            if self.session is None:
+                from gql import Client
+                from gql.transport.requests import RequestsHTTPTransport
+
+                transport = RequestsHTTPTransport(
+                    url=self.url, verify=True, timeout=self.timeout
+                )
+                client = Client(transport=transport, fetch_schema_from_transport=True)
+                self.session = client.connect_sync()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+                )
+                for prefix in "http://", "https://":
+                    transport.session.mount(prefix, adapter)
+            return self.session
+
+    def execute(self, document, variables=None):
+        from gql.transport.exceptions import TransportQueryError
+
+        request = parse(document)
+        # Repeating a mutation that may have been applied could apply it twice.
+        mutation = is_mutation(request)
+        for attempt in range(self.retries + 1):
+            trial = self.breaker.before_call()
+            try:
+                session = self.session or self.connect()
+                result = session.execute(request, variable_values=variables)
+            except TransportQueryError as error:
+                # The API answered; the document itself failed.
+                self.breaker.record_success()
+                raise GraphQLClientError(str(error)) from error
+            except Exception as error:
+                if not is_retryable(error):
+                    if trial:
+                        self.breaker.release_trial()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.retries or (mutation and not never_sent(error)):
+                    raise GraphQLClientError(
+                        f"GraphQL API failed after {attempt + 1} attempts: {error}"
+                    ) from error
+                time.sleep(backoff_delay(attempt, self.backoff, self.backoff_max))
+            except BaseException:
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_client(url=None):
+    """Return this process's shared ``HTTPClient`` for ``url``.
+
+    Keyed by process id too, so forked Celery workers don't share sockets
+    inherited from their parent.
+    """
+    url = url or getattr(settings, "CRM_GRAPHQL_URL", DEFAULT_URL)
+    key = (url, os.getpid())
+    with clients_lock:
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = HTTPClient(
+                url,
+                timeout=getattr(settings, "CRM_GRAPHQL_TIMEOUT", DEFAULT_TIMEOUT),
+                retries=getattr(settings, "CRM_GRAPHQL_RETRIES", DEFAULT_RETRIES),
+                backoff=getattr(settings, "CRM_GRAPHQL_BACKOFF", DEFAULT_BACKOFF),
+                backoff_max=getattr(
+                    settings, "CRM_GRAPHQL_BACKOFF_MAX", DEFAULT_BACKOFF_MAX
+                ),
+                breaker=CircuitBreaker(
+                    getattr(
+                        settings,
+                        "CRM_GRAPHQL_BREAKER_THRESHOLD",
+                        DEFAULT_BREAKER_THRESHOLD,
+                    ),
+                    getattr(
+                        settings, "CRM_GRAPHQL_BREAKER_RESET", DEFAULT_BREAKER_RESET
+                    ),
+                ),
+            )
+        return client
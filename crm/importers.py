@@ -0,0 +1,49 @@
+"""Streaming CSV/JSONL customer import.
+
+Input is read lazily and handed to ``crm.bulk.create_customers`` one chunk
+at a time, so memory use depends on the chunk size, not the file size.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from crm.bulk import create_customers
+
+FORMATS = ("csv", "jsonl")
+
+
+def read_rows(stream, fmt):
+    """Yield one record per row of a text ``stream`` in ``fmt``.
+
+    Malformed JSON lines yield ``None`` so they are reported against their
+    row instead of aborting the import.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}.")
+
+
+def import_customers(rows, chunk_size=1000):
+    """Import ``rows`` chunk by chunk, yielding ``(created, errors)`` per chunk.
+
+    Row indexes in the errors count from 1 across the whole input.
+    """
+    rows = iter(rows)
+    start = 1
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        created, errors = create_customers(chunk, start)
+        yield len(created), errors
+        start += len(chunk)
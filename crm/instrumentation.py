@@ -0,0 +1,265 @@
+"""Per-resolver timing and SQL accounting for GraphQL requests.
+
+``InstrumentationMiddleware`` times every resolver except graphene's
+default resolvers of scalar fields, which only read an attribute, and a
+database execute wrapper attributes each SQL query to the resolver running
+it. Both report to the ``Recorder`` the view activates for the request:
+
+* with the ``X-GraphQL-Debug: 1`` request header a record is kept for each
+  resolved path, and the breakdown is returned under ``extensions.timing``;
+* otherwise only per-field totals are kept, which feed process-wide
+  histograms served in Prometheus text format at ``/metrics``.
+
+Histograms live in process memory, so each worker exports its own series.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphql import get_named_type, is_leaf_type
+
+DEBUG_HEADER = "HTTP_X_GRAPHQL_DEBUG"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DEFAULT_RESOLVERS = {attr_resolver, dict_resolver, dict_or_attr_resolver}
+
+current_recorder = ContextVar("graphql_recorder", default=None)
+current_field = ContextVar("graphql_field", default=None)
+
+
+class FieldRecord:
+    __slots__ = ("path", "field", "duration", "sql_count", "sql_duration")
+
+    def __init__(self, path, field):
+        self.path = path
+        self.field = field
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_duration = 0.0
+
+    def as_dict(self):
+        return {
+            "path": self.path,
+            "field": self.field,
+            "durationMs": round(self.duration * 1000, 3),
+            "sqlCount": self.sql_count,
+            "sqlDurationMs": round(self.sql_duration * 1000, 3),
+        }
+
+
+class Recorder:
+    def __init__(self, debug=False):
+        self.debug = debug
+        self.start = time.perf_counter()
+        self.duration = None
+        self.fields = []
+        self.totals = {}
+        self.sql_count = 0
+        self.sql_duration = 0.0
+
+    def field_record(self, info):
+        """The record to charge a resolver with: per path, or per field name."""
+        field = f"{info.parent_type.name}.{info.field_name}"
+        if self.debug:
+            path = ".".join(str(key) for key in info.path.as_list())
+            record = FieldRecord(path, field)
+            self.fields.append(record)
+            return record
+        record = self.totals.get(field)
+        if record is None:
+            record = self.totals[field] = FieldRecord(None, field)
+        return record
+
+    def field_totals(self):
+        """Per-request totals of each field, for the histograms."""
+        if not self.debug:
+            return self.totals.values()
+        totals = {}
+        for record in self.fields:
+            total = totals.get(record.field)
+            if total is None:
+                total = totals[record.field] = FieldRecord(None, record.field)
+            total.duration += record.duration
+            total.sql_count += record.sql_count
+            total.sql_duration += record.sql_duration
+        return totals.values()
+
+    def record_sql(self, duration):
+        self.sql_count += 1
+        self.sql_duration += duration
+        record = current_field.get()
+        if record is not None:
+            record.sql_count += 1
+            record.sql_duration += duration
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def report(self):
+        return {
+            "durationMs": round(self.duration * 1000, 3),
+            "sqlCount": self.sql_count,
+            "sqlDurationMs": round(self.sql_duration * 1000, 3),
+            "resolvers": [record.as_dict() for record in self.fields],
+        }
+
+
+def join_labels(*labels):
+    return ",".join(label for label in labels if label)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels=""):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            yield f"{name}_bucket{{{join_labels(labels, le)}}} {cumulative}"
+        suffix = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{suffix} {self.sum}"
+        yield f"{name}_count{suffix} {self.count}"
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Histogram()
+        self.request_sql = 0
+        self.fields = {}
+        self.field_sql = {}
+
+    def observe(self, recorder):
+        with self.lock:
+            self.requests.observe(recorder.duration)
+            self.request_sql += recorder.sql_count
+            for record in recorder.field_totals():
+                histogram = self.fields.get(record.field)
+                if histogram is None:
+                    histogram = self.fields[record.field] = Histogram()
+                histogram.observe(record.duration)
+                self.field_sql[record.field] = (
+                    self.field_sql.get(record.field, 0) + record.sql_count
+                )
+
+    def render(self, extra=()):
+        with self.lock:
+            lines = [
+                "# HELP graphql_request_duration_seconds GraphQL request wall time.",
+                "# TYPE graphql_request_duration_seconds histogram",
+                *self.requests.lines("graphql_request_duration_seconds"),
+                "# HELP graphql_request_sql_queries_total SQL queries run by GraphQL.",
+                "# TYPE graphql_request_sql_queries_total counter",
+                f"graphql_request_sql_queries_total {self.request_sql}",
+                "# HELP graphql_resolver_duration_seconds Resolver time per request.",
+                "# TYPE graphql_resolver_duration_seconds histogram",
+            ]
+            for field, histogram in sorted(self.fields.items()):
+                lines.extend(
+                    histogram.lines(
+                        "graphql_resolver_duration_seconds", f'field="{field}"'
+                    )
+                )
+            lines += [
+                "# HELP graphql_resolver_sql_queries_total SQL queries per resolver.",
+                "# TYPE graphql_resolver_sql_queries_total counter",
+            ]
+            for field, count in sorted(self.field_sql.items()):
+                lines.append(
+                    f'graphql_resolver_sql_queries_total{{field="{field}"}} {count}'
+                )
+        lines.extend(extra)
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def record_request(request):
+    """Activate a ``Recorder`` for one GraphQL request and report it after."""
+    recorder = Recorder(debug=request.META.get(DEBUG_HEADER) == "1")
+    token = current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        current_recorder.reset(token)
+        recorder.finish()
+        metrics.observe(recorder)
+        if recorder.debug:
+            extensions = getattr(request, "graphql_extensions", None)
+            if extensions is None:
+                extensions = request.graphql_extensions = {}
+            extensions["timing"] = recorder.report()
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record_sql(time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def is_default_scalar(info):
+    """Whether the field is a scalar read by graphene's default resolver."""
+    resolve = info.parent_type.fields[info.field_name].resolve
+    if resolve is not None and getattr(resolve, "func", None) not in DEFAULT_RESOLVERS:
+        return False
+    return is_leaf_type(get_named_type(info.return_type))
+
+
+class InstrumentationMiddleware:
+    def resolve(self, next, root, info, **args):
+        recorder = current_recorder.get()
+        if recorder is None or is_default_scalar(info):
+            return next(root, info, **args)
+
+        record = recorder.field_record(info)
+
+        token = current_field.set(record)
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        finally:
+            record.duration += time.perf_counter() - start
+            current_field.reset(token)
+
+        if isawaitable(result):
+            return self.resolve_async(result, record)
+        return result
+
+    @staticmethod
+    async def resolve_async(awaitable, record):
+        token = current_field.set(record)
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            record.duration += time.perf_counter() - start
+            current_field.reset(token)
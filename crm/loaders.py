@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from crm.models import Customer, Order
+
+
+class DataLoader:
+    """Request-scoped batching loader.
+
+    Keys are queued with ``enqueue`` while a list resolver walks its rows.
+    The first ``load`` of a key that is not cached yet dispatches every
+    queued key in a single ``batch_load`` call, so resolving N rows costs
+    one query instead of N.
+    """
+
+    def __init__(self, batch_load):
+        self.batch_load = batch_load
+        self.cache = {}
+        self.queue = set()
+
+    def enqueue(self, keys):
+        self.queue.update(key for key in keys if key not in self.cache)
+
+    def prime(self, key, value):
+        self.cache.setdefault(key, value)
+
+    def dispatch(self):
+        keys = list(self.queue)
+        self.queue.clear()
+        if keys:
+            self.cache.update(zip(keys, self.batch_load(keys)))
+
+    def load(self, key):
+        if key not in self.cache:
+            self.queue.add(key)
+            self.dispatch()
+        return self.cache[key]
+
+    def resolve(self, context, key):
+        """``load`` for resolvers: off the event loop when a query is needed."""
+        if is_async(context) and key not in self.cache:
+            return sync_to_async(self.load)(key)
+        return self.load(key)
+
+
+def load_customers(keys):
+    customers = Customer.objects.in_bulk(keys)
+    return [customers.get(key) for key in keys]
+
+
+def load_products_by_order(keys):
+    through = Order.products.through
+    products = defaultdict(list)
+    rows = through.objects.filter(order_id__in=keys).select_related("product")
+    for row in rows.order_by("order_id", "product_id"):
+        products[row.order_id].append(row.product)
+    return [products[key] for key in keys]
+
+
+class Loaders:
+    def __init__(self):
+        self.customers = DataLoader(load_customers)
+        self.products_by_order = DataLoader(load_products_by_order)
+
+    def enqueue_orders(self, orders):
+        """Queue the relations of ``orders``, reusing anything already loaded.
+
+        Relations fetched by ``select_related``/``prefetch_related`` prime the
+        caches directly; deferred foreign keys are skipped so queuing never
+        triggers a per-row query.
+        """
+        for order in orders:
+            if Order.customer.is_cached(order):
+                self.customers.prime(order.customer_id, order.customer)
+            elif "customer_id" not in order.get_deferred_fields():
+                self.customers.enqueue([order.customer_id])
+
+            prefetched = getattr(order, "_prefetched_objects_cache", {})
+            if "products" in prefetched:
+                self.products_by_order.prime(order.pk, list(prefetched["products"]))
+            else:
+                self.products_by_order.enqueue([order.pk])
+
+
+def is_async(context):
+    """Whether the operation runs on the event loop (AsyncCRMGraphQLView)."""
+    return getattr(context, "is_async", False)
+
+
+def get_loaders(context):
+    """Return the loaders attached to ``context``, creating them if needed."""
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
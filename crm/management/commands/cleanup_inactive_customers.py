@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.cleanup import DEFAULT_BATCH_SIZE, DEFAULT_DAYS, delete_inactive_customers
+
+
+class Command(BaseCommand):
+    help = "Delete customers whose latest order is older than --days, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be deleted without deleting it.",
+        )
+
+    def handle(self, *args, days, batch_size, pause, dry_run, **options):
+        verb = "Would delete" if dry_run else "Deleted"
+        start = time.perf_counter()
+        customers = orders = 0
+        for batch in delete_inactive_customers(days, batch_size, dry_run, pause):
+            customers += batch.customers
+            orders += batch.orders
+            self.stdout.write(
+                f"{verb} {batch.customers} customers and {batch.orders} orders "
+                f"in {batch.duration * 1000:.0f} ms"
+            )
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {customers} inactive customers and {orders} orders "
+                f"in {elapsed:.1f} s"
+            )
+        )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from crm.exports import CHUNK_SIZE, EXPORTS, FORMATS, ExportError, export
+
+
+class Command(BaseCommand):
+    help = "Stream orders or customers as CSV or JSONL to a file (or - for stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=tuple(EXPORTS))
+        parser.add_argument("path", nargs="?", default="-")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Output format; guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="A filter of the matching GraphQL connection, e.g. "
+            "order_date__gte=2025-01-01. Repeatable.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, kind, path, format, filter, chunk_size, **options):
+        if format is None:
+            format = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+        params = QueryDict(mutable=True)
+        for item in filter:
+            name, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Filters must look like NAME=VALUE, got {item!r}.")
+            params.appendlist(name, value)
+        try:
+            lines = export(kind, format, params, chunk_size)
+        except ExportError as error:
+            raise CommandError(str(error))
+
+        if path == "-":
+            # Written as-is; OutputWrapper.write would append a newline to each line.
+            self.stdout.writelines(lines)
+            return
+        try:
+            stream = open(path, "w", newline="", encoding="utf-8")
+        except OSError as error:
+            raise CommandError(f"Cannot open {path}: {error}")
+        with stream:
+            stream.writelines(lines)
+        self.stdout.write(self.style.SUCCESS(f"Exported {kind} to {path}."))
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importers import FORMATS, import_customers, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import customers from a CSV or JSONL file (or - for stdin), in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Input format; guessed from the file extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, path, format, chunk_size, **options):
+        if format is None:
+            format = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+        if path == "-":
+            self.run(sys.stdin, format, chunk_size)
+            return
+        try:
+            stream = open(path, newline="", encoding="utf-8")
+        except OSError as error:
+            raise CommandError(f"Cannot open {path}: {error}")
+        with stream:
+            self.run(stream, format, chunk_size)
+
+    def run(self, stream, format, chunk_size):
+        created = failed = 0
+        for count, errors in import_customers(read_rows(stream, format), chunk_size):
+            created += count
+            failed += len(errors)
+            for error in errors:
+                self.stderr.write(f"Row {error.index}: {error.message}")
+            self.stdout.write(f"Imported {created} customers, {failed} rows rejected")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Done: {created} created, {failed} rejected.")
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.search import CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search index for customers, products and orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, chunk_size, **options):
+        counts = rebuild(chunk_size)
+        summary = ", ".join(f"{count} {kind}s" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {summary}."))
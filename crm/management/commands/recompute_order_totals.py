@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import Order
+from crm.pricing import recompute_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.total_amount from order products, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--start-id", type=int, default=0, help="Resume after this order id."
+        )
+
+    def handle(self, *args, chunk_size, start_id, **options):
+        remaining = Order.objects.filter(pk__gt=start_id)
+        total = remaining.count()
+        done = 0
+        last_pk = start_id
+
+        while True:
+            ids = list(
+                Order.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            recompute_totals(Order.objects.filter(pk__in=ids))
+            done += len(ids)
+            last_pk = ids[-1]
+            percent = 100 * done / total if total else 100
+            self.stdout.write(
+                f"Recomputed {done}/{total} orders ({percent:.1f}%), last id {last_pk}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {done} orders recomputed."))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from crm.seeding import CHUNK_SIZE, seed
+
+
+class Command(BaseCommand):
+    help = "Insert generated customers, products and orders with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--orders", type=int, default=5000)
+        parser.add_argument(
+            "--items", type=int, default=3, help="Maximum products per order."
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=730,
+            help="Spread order dates over this many days.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--skip-search-index",
+            action="store_true",
+            help="Don't rebuild the search index afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        if options["customers"] < 1 and options["orders"]:
+            raise CommandError("Orders need at least one customer.")
+        if options["products"] < 1 and options["orders"]:
+            raise CommandError("Orders need at least one product.")
+        start = time.perf_counter()
+        try:
+            counts = seed(
+                customers=options["customers"],
+                products=options["products"],
+                orders=options["orders"],
+                items=options["items"],
+                days=options["days"],
+                seed=options["seed"],
+                chunk_size=options["chunk_size"],
+                index=not options["skip_search_index"],
+            )
+        except IntegrityError as error:
+            raise CommandError(
+                f"Seeding failed ({error}); was --seed {options['seed']} used before?"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {counts['customers']} customers, {counts['products']} "
+                f"products and {counts['orders']} orders ({counts['items']} items) "
+                f"in {time.perf_counter() - start:.1f}s."
+            )
+        )
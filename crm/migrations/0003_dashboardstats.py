@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0002_order_date_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_customers", models.IntegerField(default=0)),
+                ("total_orders", models.IntegerField(default=0)),
+                (
+                    "total_revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("reconciled_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "dashboard stats",
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def capture_unit_prices(apps, schema_editor):
+    OrderItem = apps.get_model("crm", "OrderItem")
+    Product = apps.get_model("crm", "Product")
+    OrderItem.objects.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0003_dashboardstats"),
+    ]
+
+    operations = [
+        # Adopt the auto-created Order.products table as OrderItem without
+        # touching the database, then add the new columns to it.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="OrderItem",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "order",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="items",
+                                to="crm.order",
+                            ),
+                        ),
+                        (
+                            "product",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="crm.product",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "crm_order_products",
+                        "unique_together": {("order", "product")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="order",
+                    name="products",
+                    field=models.ManyToManyField(
+                        through="crm.OrderItem", to="crm.product"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="quantity",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.RunPython(capture_unit_prices, migrations.RunPython.noop),
+    ]
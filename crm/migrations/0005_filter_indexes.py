@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Django compiles ``icontains`` on PostgreSQL to ``UPPER(col::text) LIKE
+# UPPER(%s)``, so the trigram indexes are built on that expression.
+TRIGRAM_INDEXES = [
+    ("crm_customer_name_trgm", "crm_customer", "name"),
+    ("crm_customer_email_trgm", "crm_customer", "email"),
+    ("crm_product_name_trgm", "crm_product", "name"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0004_orderitem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["created_at", "id"], name="crm_customer_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["name"], name="crm_customer_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["phone"], name="crm_customer_phone_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["total_amount"], name="crm_order_total_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["name"], name="crm_product_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price"], name="crm_product_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["stock"], name="crm_product_stock_idx"),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
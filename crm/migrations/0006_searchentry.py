@@ -0,0 +1,142 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:08
+
+from django.db import migrations, models
+
+SQLITE_FTS = [
+    # External-content FTS5 table: it stores only the index and reads the
+    # text from crm_searchentry, kept in sync by the triggers below.
+    "CREATE VIRTUAL TABLE crm_searchentry_fts USING fts5("
+    "text, content='crm_searchentry', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER crm_searchentry_ai AFTER INSERT ON crm_searchentry BEGIN "
+    "INSERT INTO crm_searchentry_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER crm_searchentry_ad AFTER DELETE ON crm_searchentry BEGIN "
+    "INSERT INTO crm_searchentry_fts(crm_searchentry_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER crm_searchentry_au AFTER UPDATE ON crm_searchentry BEGIN "
+    "INSERT INTO crm_searchentry_fts(crm_searchentry_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO crm_searchentry_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS crm_searchentry_au",
+    "DROP TRIGGER IF EXISTS crm_searchentry_ad",
+    "DROP TRIGGER IF EXISTS crm_searchentry_ai",
+    "DROP TABLE IF EXISTS crm_searchentry_fts",
+]
+POSTGRES_FTS = [
+    "ALTER TABLE crm_searchentry ADD COLUMN document tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED",
+    "CREATE INDEX crm_searchentry_document_idx ON crm_searchentry "
+    "USING gin (document)",
+]
+POSTGRES_FTS_DROP = [
+    "DROP INDEX IF EXISTS crm_searchentry_document_idx",
+    "ALTER TABLE crm_searchentry DROP COLUMN IF EXISTS document",
+]
+
+
+CHUNK_SIZE = 1000
+
+
+# Copies of the text builders in crm.search as of this migration, so later
+# changes to the app code can't change what the migration does.
+def customer_text(customer):
+    return " ".join(filter(None, [customer.name, customer.email, customer.phone]))
+
+
+def product_text(product):
+    return product.name
+
+
+def order_text(order):
+    names = [product.name for product in order.products.all()]
+    return " ".join([str(order.pk), order.customer.name, *names])
+
+
+def backfill(apps, schema_editor):
+    # Index the rows that exist already; from here on signals and the bulk
+    # paths keep the entries current.
+    db = schema_editor.connection.alias
+    SearchEntry = apps.get_model("crm", "SearchEntry")
+    sources = [
+        ("customer", apps.get_model("crm", "Customer").objects, customer_text),
+        ("product", apps.get_model("crm", "Product").objects, product_text),
+        (
+            "order",
+            apps.get_model("crm", "Order")
+            .objects.select_related("customer")
+            .prefetch_related("products"),
+            order_text,
+        ),
+    ]
+    for kind, queryset, text in sources:
+        last_pk = 0
+        while True:
+            rows = list(
+                queryset.using(db).filter(pk__gt=last_pk).order_by("pk")[:CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            SearchEntry.objects.using(db).bulk_create(
+                SearchEntry(kind=kind, object_id=row.pk, text=text(row)) for row in rows
+            )
+            last_pk = rows[-1].pk
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0005_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("customer", "Customer"),
+                            ("product", "Product"),
+                            ("order", "Order"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("text", models.TextField()),
+            ],
+            options={
+                "verbose_name_plural": "search entries",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="searchentry",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id"), name="crm_searchentry_object_uniq"
+            ),
+        ),
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FTS, "postgresql": POSTGRES_FTS}),
+            run({"sqlite": SQLITE_FTS_DROP, "postgresql": POSTGRES_FTS_DROP}),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
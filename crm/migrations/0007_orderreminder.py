@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0006_searchentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderReminder",
+            fields=[
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="reminder",
+                        serialize=False,
+                        to="crm.order",
+                    ),
+                ),
+                ("sent_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
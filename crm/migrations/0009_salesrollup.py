@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0008_crmreport"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesRollupState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("watermark", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StaleSalesDay",
+            fields=[
+                ("day", models.DateField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="DailySalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("orders", models.IntegerField(default=0)),
+                ("units", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="crm.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["product", "day"], name="crm_rollup_product_day_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailysalesrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "product"), name="crm_rollup_day_product_uniq"
+            ),
+        ),
+    ]
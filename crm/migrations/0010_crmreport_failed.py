@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0009_salesrollup"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="crmreport",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+    ]
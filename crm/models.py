@@ -1,16 +1,64 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator
 
+from crm import response_cache
+
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination over (created_at, id) in allCustomers.
+            models.Index(
+                fields=["created_at", "id"], name="crm_customer_created_id_idx"
+            ),
+            models.Index(fields=["name"], name="crm_customer_name_idx"),
+            models.Index(fields=["phone"], name="crm_customer_phone_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def restock_below(self, threshold, amount, chunk_size=1000):
+        """Add ``amount`` to the stock of every product below ``threshold``.
+
+        Each chunk of at most ``chunk_size`` products is locked, bumped with a
+        single ``UPDATE ... SET stock = stock + amount`` and re-read in one
+        query, inside its own short transaction. Returns ``(name, stock)``
+        pairs for the restocked products.
+        """
+        restocked = []
+        last_pk = None
+        while True:
+            # Locked reads and the update share the primary's transaction.
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                candidates = self.filter(stock__lt=threshold)
+                if last_pk is not None:
+                    candidates = candidates.filter(pk__gt=last_pk)
+                ids = list(
+                    candidates.select_for_update()
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:chunk_size]
+                )
+                if not ids:
+                    return restocked
+                self.filter(pk__in=ids, stock__lt=threshold).update(
+                    stock=F("stock") + amount
+                )
+                response_cache.bump(self.model, using=self.db)
+                restocked.extend(
+                    self.filter(pk__in=ids).order_by("pk").values_list("name", "stock")
+                )
+            last_pk = ids[-1]
+
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(
@@ -18,18 +66,188 @@ class Product(models.Model):
     )
     stock = models.PositiveIntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name"], name="crm_product_name_idx"),
+            models.Index(fields=["price"], name="crm_product_price_idx"),
+            models.Index(fields=["stock"], name="crm_product_stock_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(Product, through="OrderItem")
     order_date = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Bumped by every write, including the bulk ``update()`` paths; the sales
+    # rollup uses it to find the days to refresh.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination over (order_date, id) in Query.orders.
+            models.Index(fields=["order_date", "id"], name="crm_order_date_id_idx"),
+            models.Index(fields=["total_amount"], name="crm_order_total_idx"),
+            # First/last order per customer, used by reports and cleanup.
+            models.Index(
+                fields=["customer", "order_date"], name="crm_order_customer_date_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.customer.name}"
 
     def calculate_total(self):
-        return sum(product.price for product in self.products.all())
+        total = self.items.aggregate(total=models.Sum(F("quantity") * F("unit_price")))[
+            "total"
+        ]
+        return total if total is not None else 0
+
+
+class OrderItem(models.Model):
+    """A product line on an order, with the price captured when it was added.
+
+    Reuses the table of the former auto-created ``Order.products`` through
+    model. ``unit_price`` is filled from ``Product.price`` by
+    ``crm.pricing.recompute_totals`` when rows are added without one (e.g.
+    via ``order.products.add()``).
+    """
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+
+    class Meta:
+        db_table = "crm_order_products"
+        unique_together = [("order", "product")]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} on order #{self.order_id}"
+
+
+class OrderReminder(models.Model):
+    """Marks an order whose customer has been sent a reminder."""
+
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, primary_key=True, related_name="reminder"
+    )
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reminder for order #{self.order_id}"
+
+
+class DashboardStats(models.Model):
+    """Single-row summary of the dashboard counters.
+
+    Kept current by the signal handlers in ``crm.signals`` and periodically
+    rebuilt from the source tables by ``crm.stats.reconcile``.
+    """
+
+    total_customers = models.IntegerField(default=0)
+    total_orders = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "dashboard stats"
+
+
+class SearchEntry(models.Model):
+    """Denormalized search text for one customer, product or order.
+
+    Maintained by ``crm.search`` and queried through a backend-specific
+    full-text index created by migration 0006 (an FTS5 table on SQLite, a
+    ``tsvector`` column on PostgreSQL).
+    """
+
+    CUSTOMER = "customer"
+    PRODUCT = "product"
+    ORDER = "order"
+    KIND_CHOICES = [(CUSTOMER, "Customer"), (PRODUCT, "Product"), (ORDER, "Order")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="crm_searchentry_object_uniq"
+            ),
+        ]
+        verbose_name_plural = "search entries"
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
+
+
+class CRMReport(models.Model):
+    """A sales report over ``[period_start, period_end)``.
+
+    Computed by the ``crm.tasks.generate_crm_report`` chord; ``data`` holds
+    the figures in the shape built by ``crm.reports.merge``.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (DONE, "Done"), (FAILED, "Failed")]
+
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Report {self.period_start:%Y-%m-%d} - {self.period_end:%Y-%m-%d}"
+
+
+class DailySalesRollup(models.Model):
+    """Sales of one product on one day; ``product=None`` is the day's total.
+
+    Derived from orders by ``crm.rollups.refresh``.
+    """
+
+    day = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, null=True, blank=True
+    )
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product"], name="crm_rollup_day_product_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["product", "day"], name="crm_rollup_product_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"Sales on {self.day} of {self.product_id or 'all products'}"
+
+
+class SalesRollupState(models.Model):
+    """Single row holding the rollup's refresh watermark."""
+
+    watermark = models.DateTimeField(null=True, blank=True)
+
+
+class StaleSalesDay(models.Model):
+    """A day whose rollup rows must be rebuilt, e.g. after orders were deleted."""
+
+    day = models.DateField(primary_key=True)
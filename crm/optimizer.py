@@ -0,0 +1,120 @@
+"""Derive ``select_related``/``prefetch_related``/``only`` from a GraphQL selection.
+
+Resolvers returning querysets of ``DjangoObjectType`` models call
+``optimize(queryset, info)`` so only the columns and relations the client
+actually asked for are loaded.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def collect_fields(field_nodes, fragments):
+    """Group the sub-selections of ``field_nodes`` by field name.
+
+    Fragments are flattened and repeated fields (including aliases of the
+    same field) are merged so their selections are planned together.
+    """
+    fields = {}
+
+    def visit(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                visit(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    visit(fragment.selection_set)
+
+    for node in field_nodes:
+        visit(node.selection_set)
+    return fields
+
+
+def selected_fields(info, path=()):
+    """Return the grouped selections below ``info``'s field, following ``path``.
+
+    ``path`` walks through wrapper types, e.g. ``("edges", "node")`` for a
+    Relay connection.
+    """
+    field_nodes = info.field_nodes
+    for name in path:
+        field_nodes = collect_fields(field_nodes, info.fragments).get(name, [])
+    return collect_fields(field_nodes, info.fragments)
+
+
+def plan(model, fields, fragments, prefix=""):
+    """Return ``(only, select_related, prefetch_related)`` for ``model``.
+
+    ``only`` is ``None`` when a selected field has no model counterpart; a
+    custom resolver may need any column, so pruning is skipped.
+    """
+    only = {prefix + model._meta.pk.name}
+    select = []
+    prefetch = []
+
+    for graphql_name, nodes in fields.items():
+        if graphql_name.startswith("__"):
+            continue
+        try:
+            field = model._meta.get_field(to_snake_case(graphql_name))
+        except FieldDoesNotExist:
+            only = None
+            continue
+
+        children = collect_fields(nodes, fragments)
+        related = field.related_model
+
+        if field.many_to_many or field.one_to_many:
+            queryset = related._default_manager.all()
+            extra = [field.field.name] if field.one_to_many else []
+            prefetch.append(
+                Prefetch(
+                    prefix + field.name,
+                    queryset=apply(queryset, children, fragments, extra),
+                )
+            )
+        elif field.is_relation:
+            name = prefix + field.name
+            select.append(name)
+            nested_only, nested_select, nested_prefetch = plan(
+                related, children, fragments, prefix=name + "__"
+            )
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+            if only is not None:
+                only.add(name)
+                if nested_only is None:
+                    only = None
+                else:
+                    only.update(nested_only)
+        elif only is not None:
+            only.add(prefix + field.name)
+
+    return only, select, prefetch
+
+
+def apply(queryset, fields, fragments, extra_only=()):
+    only, select, prefetch = plan(queryset.model, fields, fragments)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*only, *extra_only)
+    return queryset
+
+
+def optimize(queryset, info, path=(), extra_only=()):
+    """Optimize ``queryset`` for the selection at ``path`` below ``info``.
+
+    ``extra_only`` lists columns the resolver itself needs (e.g. ordering
+    columns used to build cursors) even when the client did not select them.
+    """
+    return apply(queryset, selected_fields(info, path), info.fragments, extra_only)
@@ -0,0 +1,140 @@
+"""Persisted queries and the parsed/validated document cache.
+
+Clients may send ``extensions.persistedQuery.sha256Hash`` instead of the
+query text (Apollo's automatic persisted queries): an unknown hash answers
+``PersistedQueryNotFound`` and the client retries once with the full text,
+which is then registered under its hash in Django's cache. Anyone can
+register, so entries expire after ``GRAPHQL_PERSISTED_QUERY_TTL`` seconds
+(a day by default) and texts longer than
+``GRAPHQL_PERSISTED_QUERY_MAX_LENGTH`` characters are run but not kept.
+
+Whatever way the text arrives, its parsed and validated AST is kept in an
+in-process LRU keyed by the same hash, so repeated operations skip both
+``parse`` and ``validate``.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, parse, validate
+
+REGISTRY_PREFIX = "crm:persisted-query:"
+REGISTRY_TTL = 24 * 60 * 60
+MAX_QUERY_LENGTH = 10_000
+
+
+class PersistedQueryError(GraphQLError):
+    def __init__(self, message, code):
+        super().__init__(message, extensions={"code": code})
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def resolve(query, extensions):
+    """Return the query text for a request, registering it if it is new."""
+    persisted = (extensions or {}).get("persistedQuery")
+    if not persisted:
+        return query
+
+    digest = persisted.get("sha256Hash")
+    if persisted.get("version") != 1 or not digest:
+        raise PersistedQueryError(
+            "Unsupported persisted query version.", "PERSISTED_QUERY_NOT_SUPPORTED"
+        )
+
+    if query is None:
+        query = cache.get(REGISTRY_PREFIX + digest)
+        if query is None:
+            raise PersistedQueryError(
+                "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+            )
+        return query
+
+    if query_hash(query) != digest:
+        raise PersistedQueryError(
+            "Provided sha256Hash does not match query.", "BAD_PERSISTED_QUERY"
+        )
+    if len(query) <= getattr(
+        settings, "GRAPHQL_PERSISTED_QUERY_MAX_LENGTH", MAX_QUERY_LENGTH
+    ):
+        cache.set(
+            REGISTRY_PREFIX + digest,
+            query,
+            timeout=getattr(settings, "GRAPHQL_PERSISTED_QUERY_TTL", REGISTRY_TTL),
+        )
+    return query
+
+
+class CachedDocument:
+    __slots__ = ("document", "errors", "costs")
+
+    def __init__(self, document, errors):
+        self.document = document
+        self.errors = errors
+        # Per-operation (cost, depth), filled in lazily by the view.
+        self.costs = {}
+
+
+class DocumentCache:
+    """Thread-safe LRU of parsed and validated documents.
+
+    Entries are only valid for one schema and set of validation rules, so
+    each view configuration should own its cache.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, schema, query, rules=None):
+        key = query_hash(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            entry = CachedDocument(None, [error])
+        else:
+            errors = validate(
+                schema, document, rules, graphene_settings.MAX_VALIDATION_ERRORS
+            )
+            entry = CachedDocument(document, errors)
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+document_cache = DocumentCache(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 512))
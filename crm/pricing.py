@@ -0,0 +1,65 @@
+"""Keep ``Order.total_amount`` in step with the items on each order.
+
+Totals are recomputed in SQL: a single ``UPDATE`` sets every affected
+order's total from an aggregate over ``OrderItem`` (quantity times the
+captured unit price), so repricing a batch of orders costs the same few
+queries as repricing one.
+"""
+
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from crm import response_cache, stats
+from crm.models import Order, OrderItem, Product
+
+AMOUNT = DecimalField(max_digits=10, decimal_places=2)
+
+
+def line_total():
+    return F("quantity") * F("unit_price")
+
+
+def totals_subquery():
+    """Sum of line totals for the order referenced by ``OuterRef("pk")``."""
+    items = (
+        OrderItem.objects.filter(order_id=OuterRef("pk"))
+        .values("order_id")
+        .annotate(total=Sum(line_total(), output_field=AMOUNT))
+        .values("total")
+    )
+    return Subquery(items, output_field=AMOUNT)
+
+
+def capture_unit_prices(orders):
+    """Snapshot ``Product.price`` onto items of ``orders`` that lack a price."""
+    current_price = Product.objects.filter(pk=OuterRef("product_id")).values("price")
+    OrderItem.objects.filter(order__in=orders, unit_price__isnull=True).update(
+        unit_price=Subquery(current_price[:1])
+    )
+
+
+def revenue(orders):
+    return orders.aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
+
+
+def recompute_totals(orders):
+    """Recompute ``total_amount`` for the ``orders`` queryset in one UPDATE.
+
+    ``QuerySet.update`` skips ``post_save``, so the dashboard revenue is
+    adjusted here by the difference. Returns the number of orders updated.
+    """
+    using = router.db_for_write(orders.model)
+    with transaction.atomic(using=using):
+        capture_unit_prices(orders)
+        before = revenue(orders)
+        updated = orders.update(
+            total_amount=Coalesce(totals_subquery(), Value(Decimal("0"))),
+            updated_at=timezone.now(),
+        )
+        stats.adjust(revenue=revenue(orders) - before)
+        response_cache.bump(Order, using=using)
+    return updated
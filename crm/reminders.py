@@ -0,0 +1,109 @@
+"""Order reminder pipeline.
+
+Recent orders are read page by page through the ``allOrders`` connection,
+orders that already have an ``OrderReminder`` are skipped, and the rest
+are handed to a notifier on a thread pool. While one page is being sent
+the next one is fetched, and each page's outcome is yielded as soon as it
+is done, so callers can log progress as it happens. A marker is written
+for every reminder sent, so a rerun doesn't send it again.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.utils import timezone
+
+from crm.graphql_client import execute
+from crm.models import OrderReminder
+from crm.pagination import MAX_PAGE_SIZE
+
+DEFAULT_DAYS = 7
+DEFAULT_WORKERS = 8
+
+ORDERS_QUERY = """
+    query RecentOrders($since: Date!, $first: Int!, $after: String) {
+        allOrders(orderDate_Gte: $since, first: $first, after: $after) {
+            edges {
+                node {
+                    id
+                    orderDate
+                    customer { name email }
+                }
+            }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+"""
+
+
+class Page:
+    __slots__ = ("sent", "skipped", "failed")
+
+    def __init__(self, sent, skipped, failed):
+        # ``sent`` holds order nodes, ``failed`` ``(node, exception)`` pairs
+        # and ``skipped`` the number of orders reminded before.
+        self.sent = sent
+        self.skipped = skipped
+        self.failed = failed
+
+
+def recent_orders(since, page_size=MAX_PAGE_SIZE, transport=None):
+    """Yield lists of order nodes placed on or after the date ``since``."""
+    variables = {"since": since.isoformat(), "first": page_size, "after": None}
+    while True:
+        orders = execute(ORDERS_QUERY, variables, transport)["allOrders"]
+        yield [edge["node"] for edge in orders["edges"]]
+        if not orders["pageInfo"]["hasNextPage"]:
+            return
+        variables["after"] = orders["pageInfo"]["endCursor"]
+
+
+def send_reminders(
+    notify,
+    days=DEFAULT_DAYS,
+    page_size=MAX_PAGE_SIZE,
+    workers=DEFAULT_WORKERS,
+    transport=None,
+):
+    """Call ``notify(order)`` for recent orders not reminded yet.
+
+    ``notify`` runs on worker threads and should not use the database; an
+    exception marks that order as failed so it is retried next run. Yields
+    a ``Page`` per page of orders.
+    """
+    since = timezone.localdate() - timedelta(days=days)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = None
+        for orders in recent_orders(since, page_size, transport):
+            submitted = submit(pool, notify, orders)
+            if in_flight is not None:
+                yield finish(*in_flight)
+            in_flight = submitted
+        if in_flight is not None:
+            yield finish(*in_flight)
+
+
+def submit(pool, notify, orders):
+    reminded = set(
+        OrderReminder.objects.filter(
+            order_id__in=[order["id"] for order in orders]
+        ).values_list("order_id", flat=True)
+    )
+    pending = [order for order in orders if int(order["id"]) not in reminded]
+    futures = [pool.submit(notify, order) for order in pending]
+    return pending, futures, len(orders) - len(pending)
+
+
+def finish(orders, futures, skipped):
+    sent, failed = [], []
+    for order, future in zip(orders, futures):
+        error = future.exception()
+        if error is None:
+            sent.append(order)
+        else:
+            failed.append((order, error))
+    OrderReminder.objects.bulk_create(
+        [OrderReminder(order_id=order["id"]) for order in sent],
+        ignore_conflicts=True,
+    )
+    return Page(sent, skipped, failed)
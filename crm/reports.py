@@ -0,0 +1,175 @@
+"""Sales reports computed in parallel over date partitions.
+
+``aggregate_partition`` summarizes the orders of one date range into a
+JSON-serializable partial; ``merge`` combines the partials of a report
+period. Every figure is additive across partitions, so the merged report
+matches one computed over the whole period at once:
+
+* revenue by day, per-product and per-customer sales are summed;
+* new customers are counted in the partition holding their first order
+  ever, returning ones in the partition holding their first order of the
+  period, so each customer is counted once.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from crm.models import CRMReport, Customer, Order, OrderItem, Product
+from crm.pricing import AMOUNT, line_total
+
+TOP = 10
+CENT = Decimal("0.01")
+
+
+def partitions(start, end, days):
+    """Split ``[start, end)`` into consecutive ranges of ``days`` days."""
+    step = timedelta(days=days)
+    while start < end:
+        yield start, min(start + step, end)
+        start += step
+
+
+def orders_between(start, end):
+    return Order.objects.filter(order_date__gte=start, order_date__lt=end)
+
+
+def customer_orders(start, end):
+    """Orders of ``OuterRef("customer")`` in ``[start, end)``.
+
+    ``start=None`` means since the customer's first order.
+    """
+    orders = Order.objects.filter(customer=OuterRef("customer"))
+    if start is not None:
+        orders = orders.filter(order_date__gte=start)
+    return orders.filter(order_date__lt=end)
+
+
+def aggregate_partition(start, end, period_start):
+    """Summarize orders in ``[start, end)``, part of a period from ``period_start``."""
+    orders = orders_between(start, end)
+
+    days = (
+        orders.annotate(day=TruncDate("order_date"))
+        .values("day")
+        .annotate(orders=Count("pk"), revenue=Sum("total_amount"))
+        .order_by()
+    )
+    products = (
+        OrderItem.objects.filter(order__in=orders)
+        .values("product_id")
+        .annotate(units=Sum("quantity"), revenue=Sum(line_total(), output_field=AMOUNT))
+        .order_by()
+    )
+    customers = (
+        orders.values("customer_id")
+        .annotate(orders=Count("pk"), revenue=Sum("total_amount"))
+        .order_by()
+    )
+    new_customers = orders.filter(~Exists(customer_orders(None, start)))
+    returning_customers = orders.filter(
+        Exists(customer_orders(None, period_start)),
+        ~Exists(customer_orders(period_start, start)),
+    )
+
+    return {
+        "days": {
+            row["day"].isoformat(): [row["orders"], str(row["revenue"])] for row in days
+        },
+        "products": {
+            str(row["product_id"]): [row["units"], str(row["revenue"] or 0)]
+            for row in products
+        },
+        "customers": {
+            str(row["customer_id"]): [row["orders"], str(row["revenue"])]
+            for row in customers
+        },
+        "new_customers": new_customers.values("customer_id").distinct().count(),
+        "returning_customers": (
+            returning_customers.values("customer_id").distinct().count()
+        ),
+    }
+
+
+def money(value):
+    return str(Decimal(value).quantize(CENT))
+
+
+def merge(partials):
+    """Combine the partials of one period into the report data."""
+    days, products, customers = {}, {}, {}
+    new_customers = returning_customers = 0
+    for partial in partials:
+        for day, (orders, revenue) in partial["days"].items():
+            total = days.setdefault(day, [0, Decimal(0)])
+            total[0] += orders
+            total[1] += Decimal(revenue)
+        for pk, (quantity, revenue) in partial["products"].items():
+            total = products.setdefault(int(pk), [0, Decimal(0)])
+            total[0] += quantity
+            total[1] += Decimal(revenue)
+        for pk, (orders, revenue) in partial["customers"].items():
+            total = customers.setdefault(int(pk), [0, Decimal(0)])
+            total[0] += orders
+            total[1] += Decimal(revenue)
+        new_customers += partial["new_customers"]
+        returning_customers += partial["returning_customers"]
+
+    top_products = sorted(products.items(), key=lambda item: -item[1][1])[:TOP]
+    names = Product.objects.in_bulk([pk for pk, _ in top_products])
+    top_customers = sorted(customers.items(), key=lambda item: (-item[1][1], item[0]))[
+        :TOP
+    ]
+    people = Customer.objects.in_bulk([pk for pk, _ in top_customers])
+
+    return {
+        "total_orders": sum(orders for orders, _ in days.values()),
+        "total_revenue": money(sum((revenue for _, revenue in days.values()), 0)),
+        "new_customers": new_customers,
+        "returning_customers": returning_customers,
+        "revenue_by_day": [
+            {"day": day, "orders": orders, "revenue": money(revenue)}
+            for day, (orders, revenue) in sorted(days.items())
+        ],
+        "top_products": [
+            {
+                "product_id": pk,
+                "name": names[pk].name if pk in names else None,
+                "quantity": quantity,
+                "revenue": money(revenue),
+            }
+            for pk, (quantity, revenue) in top_products
+        ],
+        "top_customers": [
+            {
+                "customer_id": pk,
+                "name": people[pk].name if pk in people else None,
+                "email": people[pk].email if pk in people else None,
+                "orders": orders,
+                "revenue": money(revenue),
+            }
+            for pk, (orders, revenue) in top_customers
+        ],
+    }
+
+
+def complete(report, partials):
+    report.data = merge(partials)
+    report.status = CRMReport.DONE
+    report.completed_at = timezone.now()
+    report.save(update_fields=["data", "status", "completed_at"])
+    return report
+
+
+def run(report, partition_days):
+    """Compute ``report`` in-process, one partition after the other."""
+    partials = [
+        aggregate_partition(start, end, report.period_start)
+        for start, end in partitions(
+            report.period_start, report.period_end, partition_days
+        )
+    ]
+    return complete(report, partials)
@@ -0,0 +1,154 @@
+"""Whole-response cache for read-only root queries.
+
+Query operations whose root fields all have an entry in
+``GRAPHQL_RESPONSE_CACHE_TTLS`` (``{"Query.field": seconds}``) are cached
+in Django's cache for the shortest of those TTLs. The key covers the
+document hash, operation name, variables, user, and a version number per
+cached model (customers, orders, products).
+
+Every write to those models bumps its version once the transaction
+commits: the signal handlers in ``crm.signals`` do it for ordinary saves
+and deletes, and the bulk paths call ``bump`` themselves. A response
+cached before a write therefore can't be served after it. The TTL only
+bounds how long results that depend on the clock, like ``orders(days:)``,
+can lag behind.
+
+The views execute operations they are about to cache on the primary: a
+replica still behind a write would otherwise let the response be cached
+under the version that write bumped to. Only cache misses pay for that.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from graphql import FieldNode, OperationType
+
+from crm.cost import setting
+
+VERSION_PREFIX = "crm:model-version:"
+RESPONSE_PREFIX = "crm:response:"
+MODELS = ("crm.customer", "crm.order", "crm.product")
+
+
+def version_key(label):
+    return VERSION_PREFIX + label
+
+
+def bump(*models, using=None):
+    """Invalidate cached responses once the current transaction commits.
+
+    Bumping only on commit means a concurrent request can't read the new
+    version and cache data from before the write under it.
+    """
+    keys = {version_key(model._meta.label_lower) for model in models}
+
+    def apply():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                new_version(key)
+
+    transaction.on_commit(apply, using=using)
+
+
+def new_version(key):
+    # Start from the clock rather than 0 so an evicted version can't
+    # come back as a number an old response was cached under.
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def versions():
+    keys = [version_key(label) for label in MODELS]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def operation_ttl(operation_ast):
+    """Return the TTL for caching ``operation_ast``, or ``None`` if it can't be."""
+    if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return None
+    ttls = setting("GRAPHQL_RESPONSE_CACHE_TTLS", {})
+    ttl = None
+    for selection in operation_ast.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        name = selection.name.value
+        if name == "__typename":
+            continue
+        field_ttl = ttls.get(f"Query.{name}")
+        if not field_ttl:
+            return None
+        ttl = field_ttl if ttl is None else min(ttl, field_ttl)
+    return ttl
+
+
+def user_key(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class CachedResponse:
+    __slots__ = ("key", "ttl")
+
+    def __init__(self, key, ttl):
+        self.key = key
+        self.ttl = ttl
+
+    def store(self, data):
+        cache.set(self.key, data, self.ttl)
+
+
+class ResponseCacheStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+response_stats = ResponseCacheStats()
+
+
+def lookup(request, document_hash, operation_ast, operation_name, variables):
+    """Return ``(entry, data)`` for one operation of a request.
+
+    ``entry`` is ``None`` when the operation isn't cacheable; otherwise
+    ``data`` is the cached result, or ``None`` on a miss, in which case the
+    caller stores the result with ``entry.store(data)``.
+    """
+    ttl = operation_ttl(operation_ast)
+    if ttl is None:
+        return None, None
+    payload = json.dumps(
+        [document_hash, operation_name, variables, user_key(request), versions()],
+        sort_keys=True,
+        default=str,
+        separators=(",", ":"),
+    )
+    entry = CachedResponse(
+        RESPONSE_PREFIX + hashlib.sha256(payload.encode()).hexdigest(), ttl
+    )
+    data = cache.get(entry.key)
+    response_stats.record(data is not None)
+    return entry, data
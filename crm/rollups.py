@@ -0,0 +1,176 @@
+"""Daily sales rollup, refreshed incrementally.
+
+``DailySalesRollup`` holds one row per (day, product) with sales plus a
+``product=None`` row with the day's totals, so time-series queries read
+O(days) rows instead of scanning orders.
+
+``refresh`` only rebuilds the days that changed: days of orders written
+since the last watermark (``Order.updated_at``) and days marked stale by
+deletions. Each day is rebuilt from scratch, so refreshing a day twice is
+harmless; the watermark is applied with a margin so orders committed late
+by a slow transaction are still picked up.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from crm.models import (
+    DailySalesRollup,
+    Order,
+    OrderItem,
+    SalesRollupState,
+    StaleSalesDay,
+)
+from crm.pricing import AMOUNT, line_total
+
+STATE_PK = 1
+WATERMARK_MARGIN = timedelta(minutes=5)
+CHUNK_DAYS = 31
+CENT = Decimal("0.01")
+PERIODS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def orders_on(days):
+    condition = Q()
+    for day in days:
+        start, end = day_range(day)
+        condition |= Q(order_date__gte=start, order_date__lt=end)
+    return Order.objects.filter(condition)
+
+
+def mark_stale(days):
+    StaleSalesDay.objects.bulk_create(
+        [StaleSalesDay(day=day) for day in set(days)], ignore_conflicts=True
+    )
+
+
+def order_days(orders):
+    """The distinct days of the ``orders`` queryset."""
+    return set(
+        orders.annotate(day=TruncDate("order_date"))
+        .order_by()
+        .values_list("day", flat=True)
+        .distinct()
+    )
+
+
+def rebuild_days(days):
+    """Replace the rollup rows of ``days`` with fresh aggregates."""
+    orders = orders_on(days)
+    products = (
+        OrderItem.objects.filter(order__in=orders)
+        .annotate(day=TruncDate("order__order_date"))
+        .values("day", "product_id")
+        .annotate(
+            order_count=Count("order_id"),
+            unit_count=Sum("quantity"),
+            sales=Sum(line_total(), output_field=AMOUNT),
+        )
+        .order_by()
+    )
+    totals = (
+        orders.annotate(day=TruncDate("order_date"))
+        .values("day")
+        .annotate(order_count=Count("pk"), sales=Sum("total_amount"))
+        .order_by()
+    )
+
+    rows, units = [], {}
+    for row in products:
+        units[row["day"]] = units.get(row["day"], 0) + row["unit_count"]
+        rows.append(
+            DailySalesRollup(
+                day=row["day"],
+                product_id=row["product_id"],
+                orders=row["order_count"],
+                units=row["unit_count"],
+                revenue=row["sales"] or 0,
+            )
+        )
+    for row in totals:
+        rows.append(
+            DailySalesRollup(
+                day=row["day"],
+                orders=row["order_count"],
+                units=units.get(row["day"], 0),
+                revenue=row["sales"] or 0,
+            )
+        )
+
+    DailySalesRollup.objects.filter(day__in=days).delete()
+    DailySalesRollup.objects.bulk_create(rows)
+
+
+def refresh():
+    """Rebuild the days touched since the last refresh; return how many."""
+    with transaction.atomic():
+        state, _ = SalesRollupState.objects.select_for_update().get_or_create(
+            pk=STATE_PK
+        )
+        started = timezone.now()
+        changed = Order.objects.all()
+        if state.watermark is not None:
+            changed = changed.filter(updated_at__gte=state.watermark - WATERMARK_MARGIN)
+        stale = list(StaleSalesDay.objects.values_list("day", flat=True))
+        days = sorted(order_days(changed) | set(stale))
+
+        for i in range(0, len(days), CHUNK_DAYS):
+            rebuild_days(days[i : i + CHUNK_DAYS])
+
+        StaleSalesDay.objects.filter(day__in=stale).delete()
+        state.watermark = started
+        state.save(update_fields=["watermark"])
+    return len(days)
+
+
+def sales_by_day(start, end):
+    """Day totals for ``start <= day <= end``, oldest first."""
+    return DailySalesRollup.objects.filter(
+        product=None, day__gte=start, day__lte=end
+    ).order_by("day")
+
+
+def sales_by_product(start, end, product_id=None, period="day"):
+    """Per-product sales for ``start <= day <= end`` grouped by ``period``.
+
+    Returns dicts with ``period`` (the first day of the period),
+    ``product_id``, ``product_name``, ``orders``, ``units`` and ``revenue``.
+    """
+    rows = DailySalesRollup.objects.filter(
+        product__isnull=False, day__gte=start, day__lte=end
+    )
+    if product_id is not None:
+        rows = rows.filter(product_id=product_id)
+    trunc = PERIODS[period]
+    rows = rows.annotate(period=trunc("day") if trunc else F("day"))
+    rows = (
+        rows.values("period", "product_id", "product__name")
+        .annotate(
+            order_count=Sum("orders"),
+            unit_count=Sum("units"),
+            sales=Sum("revenue"),
+        )
+        .order_by("period", "product_id")
+    )
+    return [
+        {
+            "period": row["period"],
+            "product_id": row["product_id"],
+            "product_name": row["product__name"],
+            "orders": row["order_count"],
+            "units": row["unit_count"],
+            # SQLite returns sums of decimals unrounded.
+            "revenue": row["sales"].quantize(CENT),
+        }
+        for row in rows
+    ]
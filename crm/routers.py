@@ -0,0 +1,136 @@
+"""Primary/replica database routing.
+
+When ``DATABASES`` has a ``"replica"`` alias, reads go to it and writes to
+``"default"`` (the primary). Reads stay on the primary when:
+
+* they run inside a transaction on the primary, so a read-modify-write
+  never mixes connections;
+* the code is inside ``use_primary()`` (mutations, write tasks, and
+  queries whose response is about to be cached, see ``crm.response_cache``);
+* the current request has already written, or wrote within the last
+  ``DATABASE_REPLICA_LAG`` seconds (tracked with a cookie), so a client
+  reads its own writes despite replication lag.
+
+Without a replica every query goes to ``"default"``.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = "default"
+REPLICA = "replica"
+STICKY_COOKIE = "crm_primary"
+DEFAULT_REPLICA_LAG = 5
+
+primary_pinned = ContextVar("crm_primary_pinned", default=False)
+request_state = ContextVar("crm_database_state", default=None)
+
+
+@contextmanager
+def use_primary():
+    token = primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        primary_pinned.reset(token)
+
+
+def on_primary(func):
+    """Run ``func`` with every query on the primary, e.g. a Celery write task."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_primary():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class RequestState:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def read_database():
+    if REPLICA not in settings.DATABASES:
+        return PRIMARY
+    if primary_pinned.get() or connections[PRIMARY].in_atomic_block:
+        return PRIMARY
+    state = request_state.get()
+    if state is not None and (state.pinned or state.wrote):
+        return PRIMARY
+    return REPLICA
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+
+class PrimaryStickinessMiddleware:
+    """Keep a client's reads on the primary right after it writes.
+
+    Works both ways so an ASGI server keeps the async view on the event
+    loop instead of routing every request through a sync chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_state.reset(token)
+        return self.finish(state, response)
+
+    @staticmethod
+    def start(request):
+        state = RequestState(pinned=STICKY_COOKIE in request.COOKIES)
+        return state, request_state.set(state)
+
+    @staticmethod
+    def finish(state, response):
+        if state.wrote:
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=getattr(settings, "DATABASE_REPLICA_LAG", DEFAULT_REPLICA_LAG),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
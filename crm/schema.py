@@ -1,46 +1,374 @@
 import graphene
+from asgiref.sync import sync_to_async
 from graphene_django import DjangoObjectType
-from crm.models import Order, Customer, Product
-from django.db.models import Sum
+from graphene_django.filter.utils import get_filtering_args_from_filterset
+from crm import bulk, rollups, search
+from crm.filters import CustomerFilter, OrderFilter, ProductFilter
+from crm.loaders import get_loaders, is_async
+from crm.models import CRMReport, DailySalesRollup, Order, Customer, Product
+from crm.optimizer import optimize
+from crm.pagination import (
+    check_first,
+    cursor_for,
+    decode_offset,
+    encode_cursor,
+    page_queryset,
+    split_page,
+)
+from crm.stats import aget_stats, get_stats
 from django.utils import timezone
+from graphql import GraphQLError
 from datetime import timedelta
 
 
 class CustomerType(DjangoObjectType):
     class Meta:
         model = Customer
-        fields = ("id", "name")
+        fields = ("id", "name", "email")
+
+
+class ProductType(DjangoObjectType):
+    class Meta:
+        model = Product
+        fields = ("id", "name", "price", "stock")
 
 
 class OrderType(DjangoObjectType):
     customer = graphene.Field(lambda: CustomerType)
+    products = graphene.List(lambda: ProductType)
 
     class Meta:
         model = Order
-        fields = ("id", "order_date", "customer")
+        fields = ("id", "order_date", "customer", "products")
 
     def resolve_customer(self, info):
-        return self.customer
+        loader = get_loaders(info.context).customers
+        return loader.resolve(info.context, self.customer_id)
+
+    def resolve_products(self, info):
+        loader = get_loaders(info.context).products_by_order
+        return loader.resolve(info.context, self.pk)
+
+
+class DailySalesType(graphene.ObjectType):
+    day = graphene.Date()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class ProductSalesType(graphene.ObjectType):
+    product_id = graphene.ID()
+    name = graphene.String()
+    quantity = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CustomerSalesType(graphene.ObjectType):
+    customer_id = graphene.ID()
+    name = graphene.String()
+    email = graphene.String()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class ReportDataType(graphene.ObjectType):
+    total_orders = graphene.Int()
+    total_revenue = graphene.Decimal()
+    new_customers = graphene.Int()
+    returning_customers = graphene.Int()
+    revenue_by_day = graphene.List(DailySalesType)
+    top_products = graphene.List(ProductSalesType)
+    top_customers = graphene.List(CustomerSalesType)
+
+
+class CRMReportType(DjangoObjectType):
+    data = graphene.Field(ReportDataType)
+
+    class Meta:
+        model = CRMReport
+        fields = (
+            "id",
+            "period_start",
+            "period_end",
+            "status",
+            "created_at",
+            "completed_at",
+            "data",
+        )
+
+
+class SalesDayType(DjangoObjectType):
+    class Meta:
+        model = DailySalesRollup
+        fields = ("day", "orders", "units", "revenue")
+
+
+class SalesPeriod(graphene.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class ProductSalesPeriodType(graphene.ObjectType):
+    period = graphene.Date(description="First day of the period.")
+    product_id = graphene.ID()
+    product_name = graphene.String()
+    orders = graphene.Int()
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CustomerConnection(graphene.relay.Connection):
+    class Meta:
+        node = CustomerType
+
+
+class ProductConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProductType
+
+
+class OrderConnection(graphene.relay.Connection):
+    class Meta:
+        node = OrderType
+
+
+class SearchResult(graphene.Union):
+    class Meta:
+        types = (CustomerType, ProductType, OrderType)
+
+
+class SearchConnection(graphene.relay.Connection):
+    class Meta:
+        node = SearchResult
+
+
+CUSTOMER_ORDERING = ("-created_at", "-id")
+PRODUCT_ORDERING = ("id",)
+ORDER_ORDERING = ("-order_date", "-id")
+
+
+def filtered_connection(connection, filterset_class):
+    """A keyset-paginated connection field taking ``filterset_class`` args."""
+    return graphene.Field(
+        connection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        **get_filtering_args_from_filterset(filterset_class, connection._meta.node),
+    )
+
+
+def filter_queryset(filterset_class, queryset, data):
+    filterset = filterset_class(data=data, queryset=queryset)
+    if not filterset.is_valid():
+        raise GraphQLError(
+            "; ".join(
+                f"{field}: {' '.join(messages)}"
+                for field, messages in filterset.errors.items()
+            )
+        )
+    return filterset.qs
 
 
 class Query(graphene.ObjectType):
-    orders = graphene.List(OrderType, days=graphene.Int(required=True))
+    hello = graphene.String(default_value="Hello, GraphQL!")
+    orders = graphene.Field(
+        OrderConnection,
+        days=graphene.Int(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    all_customers = filtered_connection(CustomerConnection, CustomerFilter)
+    all_products = filtered_connection(ProductConnection, ProductFilter)
+    all_orders = filtered_connection(OrderConnection, OrderFilter)
+    search = graphene.Field(
+        SearchConnection,
+        query=graphene.String(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    crm_report = graphene.Field(CRMReportType, id=graphene.ID())
+    sales_by_day = graphene.List(
+        SalesDayType,
+        start=graphene.Date(name="from", required=True),
+        end=graphene.Date(name="to", required=True),
+    )
+    sales_by_product = graphene.List(
+        ProductSalesPeriodType,
+        start=graphene.Date(name="from", required=True),
+        end=graphene.Date(name="to", required=True),
+        product_id=graphene.ID(),
+        period=SalesPeriod(default_value=SalesPeriod.DAY),
+    )
     total_customers = graphene.Int()
     total_orders = graphene.Int()
     total_revenue = graphene.Float()
 
-    def resolve_orders(self, info, days):
+    def resolve_orders(self, info, days, first=None, after=None):
         cutoff_date = timezone.now() - timedelta(days=days)
-        return Order.objects.filter(order_date__gte=cutoff_date)
+        queryset = optimize(
+            Order.objects.filter(order_date__gte=cutoff_date),
+            info,
+            path=("edges", "node"),
+            extra_only=("order_date",),
+        )
+        queryset, first = page_queryset(queryset, ORDER_ORDERING, first, after)
+        if is_async(info.context):
+            return resolve_orders_async(info, queryset, first, after)
+        return order_connection(info, list(queryset), first, after)
+
+    def resolve_all_customers(self, info, first=None, after=None, **filters):
+        return resolve_in_thread(
+            info,
+            lambda: model_connection(
+                CustomerConnection,
+                CUSTOMER_ORDERING,
+                filter_queryset(CustomerFilter, Customer.objects.all(), filters),
+                info,
+                first,
+                after,
+            ),
+        )
+
+    def resolve_all_products(self, info, first=None, after=None, **filters):
+        return resolve_in_thread(
+            info,
+            lambda: model_connection(
+                ProductConnection,
+                PRODUCT_ORDERING,
+                filter_queryset(ProductFilter, Product.objects.all(), filters),
+                info,
+                first,
+                after,
+            ),
+        )
+
+    def resolve_all_orders(self, info, first=None, after=None, **filters):
+        def build():
+            queryset = optimize(
+                filter_queryset(OrderFilter, Order.objects.all(), filters),
+                info,
+                path=("edges", "node"),
+                extra_only=("order_date",),
+            )
+            queryset, page_size = page_queryset(queryset, ORDER_ORDERING, first, after)
+            return order_connection(info, list(queryset), page_size, after)
+
+        return resolve_in_thread(info, build)
+
+    def resolve_search(self, info, query, first=None, after=None):
+        return resolve_in_thread(
+            info, lambda: search_connection(info, query, first, after)
+        )
+
+    def resolve_crm_report(self, info, id=None):
+        def read():
+            if id is not None:
+                return CRMReport.objects.filter(pk=id).first()
+            return (
+                CRMReport.objects.filter(status=CRMReport.DONE)
+                .order_by("-completed_at")
+                .first()
+            )
+
+        return resolve_in_thread(info, read)
+
+    def resolve_sales_by_day(self, info, start, end):
+        return resolve_in_thread(info, lambda: list(rollups.sales_by_day(start, end)))
+
+    def resolve_sales_by_product(self, info, start, end, period, product_id=None):
+        return resolve_in_thread(
+            info,
+            lambda: rollups.sales_by_product(start, end, product_id, period.value),
+        )
 
     def resolve_total_customers(self, info):
-        return Customer.objects.count()
+        return resolve_stat(info, "total_customers")
 
     def resolve_total_orders(self, info):
-        return Order.objects.count()
+        return resolve_stat(info, "total_orders")
 
     def resolve_total_revenue(self, info):
-        return Order.objects.aggregate(total=Sum("totalamount"))["total"] or 0.0
+        return resolve_stat(info, "total_revenue")
+
+
+def resolve_in_thread(info, build):
+    # For resolvers that run several ORM steps (validating a filterset can
+    # query too, e.g. the ``customer`` choice): the async endpoint runs the
+    # whole resolver in a thread.
+    if is_async(info.context):
+        return sync_to_async(build)()
+    return build()
+
+
+def model_connection(connection, ordering, queryset, info, first, after):
+    fields = tuple(name.lstrip("-") for name in ordering)
+    queryset = optimize(queryset, info, path=("edges", "node"), extra_only=fields)
+    queryset, first = page_queryset(queryset, ordering, first, after)
+    return build_connection(connection, ordering, list(queryset), first, after)
+
+
+def order_connection(info, rows, first, after):
+    connection = build_connection(OrderConnection, ORDER_ORDERING, rows, first, after)
+    get_loaders(info.context).enqueue_orders([edge.node for edge in connection.edges])
+    return connection
+
+
+def build_connection(connection, ordering, rows, first, after):
+    nodes, has_next_page = split_page(rows, first)
+    edges = [
+        connection.Edge(node=node, cursor=cursor_for(node, ordering)) for node in nodes
+    ]
+    return connection(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=has_next_page,
+            has_previous_page=after is not None,
+        ),
+    )
+
+
+def search_connection(info, query, first, after):
+    # Results are ranked, so cursors are offsets into the ranking.
+    first = check_first(first)
+    offset = decode_offset(after) if after else 0
+    hits, has_next_page = split_page(search.search(query, first + 1, offset), first)
+    objects = search.load(hits)
+    get_loaders(info.context).enqueue_orders(
+        [obj for obj in objects.values() if isinstance(obj, Order)]
+    )
+
+    edges = [
+        SearchConnection.Edge(node=objects[hit], cursor=encode_cursor([position]))
+        for position, hit in enumerate(hits, offset + 1)
+        if hit in objects
+    ]
+    return SearchConnection(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=has_next_page,
+            has_previous_page=after is not None,
+        ),
+    )
+
+
+async def resolve_orders_async(info, queryset, first, after):
+    rows = [order async for order in queryset]
+    return order_connection(info, rows, first, after)
+
+
+def resolve_stat(info, name):
+    if is_async(info.context):
+
+        async def read():
+            return getattr(await aget_stats(), name)
+
+        return read()
+    return getattr(get_stats(), name)
 
 
 class UpdateLowStockProducts(graphene.Mutation):
@@ -53,13 +381,8 @@ class UpdateLowStockProducts(graphene.Mutation):
     updated_products = graphene.List(graphene.String)
 
     def mutate(self, info, threshold, restock_amount):
-        products = Product.objects.filter(stock__lt=threshold)
-        updated_names = []
-
-        for product in products:
-            product.stock += restock_amount
-            product.save()
-            updated_names.append(f"{product.name} ({product.stock})")
+        restocked = Product.objects.restock_below(threshold, restock_amount)
+        updated_names = [f"{name} ({stock})" for name, stock in restocked]
 
         return UpdateLowStockProducts(
             success=True,
@@ -68,8 +391,72 @@ class UpdateLowStockProducts(graphene.Mutation):
         )
 
 
+class RowErrorType(graphene.ObjectType):
+    index = graphene.Int()
+    message = graphene.String()
+
+
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(default_value=1)
+
+
+class BulkOrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    items = graphene.List(graphene.NonNull(OrderItemInput), required=True)
+
+
+class CustomerInput(graphene.InputObjectType):
+    name = graphene.String(required=True)
+    email = graphene.String(required=True)
+    phone = graphene.String()
+
+
+MAX_BULK_ORDERS = 1000
+MAX_BULK_CUSTOMERS = 1000
+
+
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        orders = graphene.List(graphene.NonNull(BulkOrderInput), required=True)
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(RowErrorType)
+
+    def mutate(self, info, orders):
+        if len(orders) > MAX_BULK_ORDERS:
+            raise GraphQLError(f"At most {MAX_BULK_ORDERS} orders per call.")
+
+        created, errors = bulk.create_orders(orders)
+        get_loaders(info.context).enqueue_orders(created)
+        return BulkCreateOrders(
+            orders=created,
+            errors=[RowErrorType(index=e.index, message=e.message) for e in errors],
+        )
+
+
+class BulkCreateCustomers(graphene.Mutation):
+    class Arguments:
+        customers = graphene.List(graphene.NonNull(CustomerInput), required=True)
+
+    customers = graphene.List(CustomerType)
+    errors = graphene.List(RowErrorType)
+
+    def mutate(self, info, customers):
+        if len(customers) > MAX_BULK_CUSTOMERS:
+            raise GraphQLError(f"At most {MAX_BULK_CUSTOMERS} customers per call.")
+
+        created, errors = bulk.create_customers(customers)
+        return BulkCreateCustomers(
+            customers=created,
+            errors=[RowErrorType(index=e.index, message=e.message) for e in errors],
+        )
+
+
 class Mutation(graphene.ObjectType):
     update_low_stock_products = UpdateLowStockProducts.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
+    bulk_create_customers = BulkCreateCustomers.Field()
 
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
@@ -0,0 +1,193 @@
+"""Full-text search over customers, products and orders.
+
+Each searchable object has one ``SearchEntry`` row holding its text. The
+signal handlers in ``crm.signals`` and the bulk write paths keep the rows
+current, and ``rebuild`` recreates them from the source tables. Lookups use
+the backend's full-text index:
+
+* SQLite: the ``crm_searchentry_fts`` FTS5 table, ranked by bm25;
+* PostgreSQL: the generated ``document`` tsvector column, ranked by
+  ``ts_rank``;
+* other backends: ``icontains`` per term, a table scan.
+
+Every term of a query must match, as a word prefix, so partial names and
+emails ("ada exa" finds ada@example.com) work.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import Prefetch
+
+from crm.models import Customer, Order, Product, SearchEntry
+
+CHUNK_SIZE = 1000
+TERM = re.compile(r"[^\W_]+")
+
+SQLITE_SEARCH = """
+    SELECT e.kind, e.object_id
+    FROM crm_searchentry_fts f JOIN crm_searchentry e ON e.id = f.rowid
+    WHERE crm_searchentry_fts MATCH %s
+    ORDER BY f.rank, f.rowid
+    LIMIT %s OFFSET %s
+"""
+POSTGRES_SEARCH = """
+    SELECT kind, object_id
+    FROM crm_searchentry, to_tsquery('simple', %s) query
+    WHERE document @@ query
+    ORDER BY ts_rank(document, query) DESC, id
+    LIMIT %s OFFSET %s
+"""
+
+MODELS = {
+    SearchEntry.CUSTOMER: Customer,
+    SearchEntry.PRODUCT: Product,
+    SearchEntry.ORDER: Order,
+}
+
+
+def customer_text(customer):
+    return " ".join(filter(None, [customer.name, customer.email, customer.phone]))
+
+
+def product_text(product):
+    return product.name
+
+
+def order_text(pk, customer_name, product_names):
+    return " ".join([str(pk), customer_name, *product_names])
+
+
+def write(kind, texts):
+    """Insert or update the entries for ``{object_id: text}``."""
+    if texts:
+        SearchEntry.objects.bulk_create(
+            [
+                SearchEntry(kind=kind, object_id=pk, text=text)
+                for pk, text in texts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["text"],
+            batch_size=CHUNK_SIZE,
+        )
+
+
+def unindex(kind, ids):
+    SearchEntry.objects.filter(kind=kind, object_id__in=ids).delete()
+
+
+def index_customers(customers):
+    write(SearchEntry.CUSTOMER, {c.pk: customer_text(c) for c in customers})
+
+
+def index_products(products):
+    write(SearchEntry.PRODUCT, {p.pk: product_text(p) for p in products})
+
+
+def index_orders(orders, chunk_size=CHUNK_SIZE):
+    """Index an order queryset, loading customers and products in bulk.
+
+    Returns the number of orders indexed.
+    """
+    count = 0
+    orders = orders.select_related("customer").prefetch_related(
+        Prefetch("products", queryset=Product.objects.only("name"))
+    )
+    for chunk in chunks(orders.only("customer__name"), chunk_size):
+        texts = {
+            order.pk: order_text(
+                order.pk, order.customer.name, [p.name for p in order.products.all()]
+            )
+            for order in chunk
+        }
+        write(SearchEntry.ORDER, texts)
+        count += len(chunk)
+    return count
+
+
+def chunks(queryset, size=CHUNK_SIZE):
+    """Yield lists of rows of ``queryset`` in primary key order."""
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        rows = list(page[:size])
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        last_pk = rows[-1].pk
+
+
+def rebuild(chunk_size=CHUNK_SIZE):
+    """Re-index every object and drop stale entries; return counts by kind."""
+    counts = {kind: 0 for kind in MODELS}
+    for customers in chunks(
+        Customer.objects.only("name", "email", "phone"), chunk_size
+    ):
+        index_customers(customers)
+        counts[SearchEntry.CUSTOMER] += len(customers)
+    for products in chunks(Product.objects.only("name"), chunk_size):
+        index_products(products)
+        counts[SearchEntry.PRODUCT] += len(products)
+    counts[SearchEntry.ORDER] = index_orders(Order.objects.all(), chunk_size)
+
+    for kind, model in MODELS.items():
+        SearchEntry.objects.filter(kind=kind).exclude(
+            object_id__in=model.objects.values("pk")
+        ).delete()
+
+    connection = connections[SearchEntry.objects.db]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            # Re-derive the FTS index from the content table, in case it
+            # drifted (e.g. rows changed with the triggers missing).
+            cursor.execute(
+                "INSERT INTO crm_searchentry_fts(crm_searchentry_fts) "
+                "VALUES ('rebuild')"
+            )
+    return counts
+
+
+def search(query, limit, offset=0):
+    """Return ``(kind, object_id)`` pairs for matches of ``query``, best first."""
+    terms = TERM.findall(query)
+    if not terms or not limit:
+        return []
+
+    connection = connections[SearchEntry.objects.db]
+    if connection.vendor == "sqlite":
+        sql, match = SQLITE_SEARCH, " ".join(f'"{term}"*' for term in terms)
+    elif connection.vendor == "postgresql":
+        sql, match = POSTGRES_SEARCH, " & ".join(f"{term}:*" for term in terms)
+    else:
+        entries = SearchEntry.objects.all()
+        for term in terms:
+            entries = entries.filter(text__icontains=term)
+        return list(
+            entries.order_by("pk").values_list("kind", "object_id")[
+                offset : offset + limit
+            ]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit, offset])
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def load(hits):
+    """Fetch the objects for ``(kind, object_id)`` hits, one query per kind.
+
+    Returns ``{(kind, object_id): object}``; objects deleted since they were
+    indexed are missing.
+    """
+    ids = {}
+    for kind, pk in hits:
+        ids.setdefault(kind, []).append(pk)
+    objects = {}
+    for kind, pks in ids.items():
+        for pk, obj in MODELS[kind].objects.in_bulk(pks).items():
+            objects[kind, pk] = obj
+    return objects
@@ -0,0 +1,114 @@
+"""Synthetic customers, products and orders for development and benchmarks.
+
+Rows are inserted chunk by chunk with ``bulk_create``, so signals don't
+run; the counters, search index and cached responses are brought up to
+date once at the end. Data is drawn from ``random.Random(seed)``, so the
+same arguments always produce the same rows. Emails are prefixed with the
+seed, and seeding twice with the same seed fails on the unique email.
+"""
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from crm import response_cache, search, stats
+from crm.models import Customer, Order, OrderItem, Product
+
+CHUNK_SIZE = 1000
+CENT = Decimal("0.01")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def seed(
+    customers=1000,
+    products=100,
+    orders=5000,
+    items=3,
+    days=730,
+    seed=0,
+    chunk_size=CHUNK_SIZE,
+    index=True,
+):
+    """Insert the rows and return ``{"customers": n, ..., "items": n}``.
+
+    Orders get ``1..items`` distinct products each and an ``order_date``
+    spread uniformly over the last ``days`` days, so some customers have
+    only old orders (the cleanup job's target) and some orders are recent
+    (what ``orders(days:)`` and the reminders read).
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    prefix = f"seed{seed}."
+    counts = {"customers": customers, "products": products, "orders": orders}
+
+    with transaction.atomic():
+        for chunk in chunked(range(customers), chunk_size):
+            Customer.objects.bulk_create(
+                Customer(
+                    name=f"Customer {seed}-{i}",
+                    email=f"{prefix}{i}@example.com",
+                    phone=f"+1555{rng.randrange(10**7):07d}",
+                )
+                for i in chunk
+            )
+        customer_ids = list(
+            Customer.objects.filter(email__startswith=prefix).values_list(
+                "pk", flat=True
+            )
+        )
+
+        created = []
+        for chunk in chunked(range(products), chunk_size):
+            created += Product.objects.bulk_create(
+                Product(
+                    name=f"Product {seed}-{i}",
+                    price=Decimal(rng.uniform(1, 500)).quantize(CENT),
+                    stock=rng.randrange(100),
+                )
+                for i in chunk
+            )
+        prices = {product.pk: product.price for product in created}
+        product_ids = list(prices)
+
+        counts["items"] = 0
+        for chunk in chunked(range(orders), chunk_size):
+            new_orders, lines = [], []
+            for _ in chunk:
+                picked = rng.sample(product_ids, rng.randint(1, min(items, products)))
+                quantities = [(pk, rng.randint(1, 3)) for pk in picked]
+                new_orders.append(
+                    Order(
+                        customer_id=rng.choice(customer_ids),
+                        total_amount=sum(prices[pk] * qty for pk, qty in quantities),
+                    )
+                )
+                lines.append(quantities)
+            Order.objects.bulk_create(new_orders)
+            # ``order_date`` is auto_now_add, so backdate after inserting.
+            for order in new_orders:
+                order.order_date = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            Order.objects.bulk_update(new_orders, ["order_date"])
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order, product_id=pk, quantity=qty, unit_price=prices[pk]
+                )
+                for order, quantities in zip(new_orders, lines)
+                for pk, qty in quantities
+            )
+            counts["items"] += sum(map(len, lines))
+
+        stats.reconcile()
+        response_cache.bump(Product)
+
+    if index:
+        search.rebuild(chunk_size)
+    return counts
@@ -0,0 +1,193 @@
+"""Signal handlers keeping totals, counters, search, sales rollups and the
+response cache current.
+
+Bulk paths that apply those side effects themselves in one go wrap their
+writes in ``muted()`` to skip the per-row handlers.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import wraps
+
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from crm import response_cache, rollups, search, stats
+from crm.models import Customer, Order, OrderItem, Product, SearchEntry
+from crm.pricing import recompute_totals
+
+handlers_muted = ContextVar("crm_signal_handlers_muted", default=False)
+
+
+@contextmanager
+def muted():
+    token = handlers_muted.set(True)
+    try:
+        yield
+    finally:
+        handlers_muted.reset(token)
+
+
+def unless_muted(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not handlers_muted.get():
+            handler(*args, **kwargs)
+
+    return wrapper
+
+
+@receiver(post_init, sender=Customer)
+@receiver(post_init, sender=Product)
+def named_loaded(sender, instance, **kwargs):
+    # Order search entries include customer and product names; remember the
+    # loaded name to tell when those entries need re-indexing.
+    instance._search_name = instance.__dict__.get("name")
+
+
+@receiver(post_save, sender=Customer)
+@unless_muted
+def customer_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(customers=1)
+    search.index_customers([instance])
+    if not created and instance._search_name != instance.name:
+        search.index_orders(Order.objects.filter(customer=instance))
+    instance._search_name = instance.name
+
+
+@receiver(post_delete, sender=Customer)
+@unless_muted
+def customer_deleted(sender, instance, **kwargs):
+    stats.adjust(customers=-1)
+    search.unindex(SearchEntry.CUSTOMER, [instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@unless_muted
+def product_saved(sender, instance, created, **kwargs):
+    search.index_products([instance])
+    if not created and instance._search_name != instance.name:
+        search.index_orders(Order.objects.filter(items__product=instance))
+    instance._search_name = instance.name
+
+
+@receiver(pre_delete, sender=Product)
+@unless_muted
+def product_deleting(sender, instance, **kwargs):
+    # The product's items are deleted with it; remember their orders.
+    instance._item_order_ids = list(
+        OrderItem.objects.filter(product=instance)
+        .values_list("order_id", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_delete, sender=Product)
+@unless_muted
+def product_deleted(sender, instance, **kwargs):
+    search.unindex(SearchEntry.PRODUCT, [instance.pk])
+    orders = Order.objects.filter(pk__in=instance._item_order_ids)
+    recompute_totals(orders)
+    search.index_orders(orders)
+    # The rollup rows of the product cascade away, but the days' totals
+    # still include its sales until those days are rebuilt.
+    rollups.mark_stale(rollups.order_days(orders))
+
+
+@receiver(post_init, sender=Order)
+def order_loaded(sender, instance, **kwargs):
+    # Remember the loaded total so saves can record the revenue delta.
+    # Read __dict__ directly: a deferred total must not trigger a query.
+    instance._stats_total = instance.__dict__.get("total_amount")
+
+
+@receiver(post_save, sender=Order)
+@unless_muted
+def order_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(orders=1, revenue=instance.total_amount)
+    elif instance._stats_total is not None:
+        delta = Decimal(str(instance.total_amount)) - Decimal(
+            str(instance._stats_total)
+        )
+        stats.adjust(revenue=delta)
+    instance._stats_total = instance.total_amount
+    search.index_orders(Order.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Order)
+@unless_muted
+def order_deleted(sender, instance, **kwargs):
+    stats.adjust(orders=-1, revenue=-instance.total_amount)
+    search.unindex(SearchEntry.ORDER, [instance.pk])
+    rollups.mark_stale([timezone.localdate(instance.order_date)])
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+@unless_muted
+def order_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            recompute_totals(Order.objects.filter(pk=instance.pk))
+            # Keep the instance current so a later save() can't write back
+            # a stale total.
+            instance.refresh_from_db(fields=["total_amount"])
+            instance._stats_total = instance.total_amount
+            search.index_orders(Order.objects.filter(pk=instance.pk))
+    elif action == "pre_clear":
+        # The links are gone by post_clear; remember which orders had them.
+        instance._cleared_order_ids = list(
+            instance.order_set.values_list("pk", flat=True)
+        )
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if action == "post_clear":
+            pk_set = instance._cleared_order_ids
+        orders = Order.objects.filter(pk__in=pk_set)
+        recompute_totals(orders)
+        search.index_orders(orders)
+
+
+def deleted_with_parent(origin):
+    # ``origin`` is the instance or queryset whose delete() cascaded here.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Customer, Order, Product)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@unless_muted
+def order_item_changed(sender, instance, origin=None, **kwargs):
+    # Items going with their order or product are accounted for by
+    # order_deleted or product_deleted.
+    if origin is not None and deleted_with_parent(origin):
+        return
+    orders = Order.objects.filter(pk=instance.order_id)
+    recompute_totals(orders)
+    search.index_orders(orders)
+    if OrderItem.order.is_cached(instance):
+        order = instance.order
+        order.refresh_from_db(fields=["total_amount"])
+        order._stats_total = order.total_amount
+
+
+# Items belong to their order's responses.
+CACHED_MODELS = {Customer: Customer, Order: Order, OrderItem: Order, Product: Product}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@unless_muted
+def invalidate_responses(sender, **kwargs):
+    model = CACHED_MODELS.get(sender)
+    if model is not None:
+        response_cache.bump(model)
@@ -0,0 +1,45 @@
+"""SQLite tuning for single-node deployments.
+
+Every new SQLite connection runs the ``PRAGMA`` statements in
+``DEFAULT_PRAGMAS``:
+
+* ``journal_mode = WAL`` lets readers run alongside the single writer
+  instead of waiting for it, which is what turns concurrent cron, Celery
+  and web traffic into ``database is locked`` errors;
+* ``synchronous = NORMAL`` syncs at checkpoints rather than on every
+  commit, which is safe with WAL (a power loss can drop the last
+  transactions, never corrupt the file);
+* ``busy_timeout`` makes a blocked writer retry for that many
+  milliseconds before giving up;
+* ``cache_size`` (negative: KiB) and ``mmap_size`` (bytes) keep more of
+  the database in memory.
+
+``SQLITE_PRAGMAS`` in settings replaces the profile; set it to ``{}`` to use
+SQLite's defaults. Other backends are left alone.
+
+``journal_mode = WAL`` is stored in the database file itself, so the first
+connection converts an existing database for good (``-wal`` and ``-shm``
+files appear next to it).
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -20000,
+    "mmap_size": 134217728,
+}
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,58 @@
+"""Incrementally maintained dashboard counters.
+
+``adjust`` applies deltas with a single ``UPDATE ... SET col = col + n`` so
+concurrent writers never lose increments; ``reconcile`` recomputes the
+row from scratch to repair any drift (bulk updates bypass signals).
+"""
+
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from crm import response_cache
+from crm.models import Customer, DashboardStats, Order
+
+STATS_PK = 1
+
+
+def get_stats():
+    stats = DashboardStats.objects.filter(pk=STATS_PK).first()
+    return stats if stats is not None else reconcile()
+
+
+async def aget_stats():
+    stats = await DashboardStats.objects.filter(pk=STATS_PK).afirst()
+    return stats if stats is not None else await sync_to_async(reconcile)()
+
+
+def adjust(customers=0, orders=0, revenue=0):
+    updates = {}
+    if customers:
+        updates["total_customers"] = F("total_customers") + customers
+    if orders:
+        updates["total_orders"] = F("total_orders") + orders
+    if revenue:
+        updates["total_revenue"] = F("total_revenue") + Decimal(str(revenue))
+    if not updates:
+        return
+    if not DashboardStats.objects.filter(pk=STATS_PK).update(**updates):
+        # First write ever: build the row from the tables, which already
+        # include the change being recorded.
+        reconcile()
+
+
+def reconcile():
+    revenue = Order.objects.aggregate(total=Sum("total_amount"))["total"]
+    stats, _ = DashboardStats.objects.update_or_create(
+        pk=STATS_PK,
+        defaults={
+            "total_customers": Customer.objects.count(),
+            "total_orders": Order.objects.count(),
+            "total_revenue": revenue or 0,
+            "reconciled_at": timezone.now(),
+        },
+    )
+    response_cache.bump(Customer, Order)
+    return stats
@@ -1,63 +1,118 @@
 import logging
-from datetime import datetime
-from celery import shared_task
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from celery import chord, shared_task
+from django.utils import timezone
+
+from crm import reports, rollups, stats
+from crm.cleanup import delete_inactive_customers
+from crm.models import CRMReport
+from crm.routers import on_primary
 
 logger = logging.getLogger(__name__)
 
+REPORT_LOG_FILE = "/tmp/crm_report_log.txt"
 
-@shared_task(bind=True)
-def generate_crm_report(self):
-    """Generates weekly CRM report via GraphQL query"""
-    log_file = "/tmp/crm_report_log.txt"
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    try:
-        # Configure GraphQL client
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=3,
+@shared_task
+@on_primary
+def generate_crm_report(days=7, partition_days=1):
+    """Builds a sales report over the last ``days`` days as a chord"""
+    period_end = timezone.now()
+    report = CRMReport.objects.create(
+        period_start=period_end - timedelta(days=days), period_end=period_end
+    )
+    header = [
+        aggregate_report_partition.s(
+            start.isoformat(), end.isoformat(), report.period_start.isoformat()
         )
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
-        # Define the report query
-        query = gql(
-            """
-            query GenerateCRMReport {
-                customerCount
-                orderCount
-                totalRevenue
-            }
-        """
+        for start, end in reports.partitions(
+            report.period_start, report.period_end, partition_days
         )
+    ]
+    callback = finalize_crm_report.s(report.pk)
+    # Called if any partition or the merge fails.
+    callback.on_error(fail_crm_report.s(report.pk))
+    chord(header)(callback)
+    return report.pk
 
-        # Execute query
-        result = client.execute(query)
-
-        # Prepare report
-        report_data = {
-            "customers": result.get("customerCount", 0),
-            "orders": result.get("orderCount", 0),
-            "revenue": result.get("totalRevenue", 0),
-        }
-
-        log_message = (
-            f"{timestamp} - Report: "
-            f"{report_data['customers']} customers, "
-            f"{report_data['orders']} orders, "
-            f"${report_data['revenue']:,.2f} revenue\n"
-        )
 
-        # Write to log file
-        with open(log_file, "a") as f:
-            f.write(log_message)
+@shared_task
+def aggregate_report_partition(start, end, period_start):
+    """Summarizes the orders of one date range of a report"""
+    return reports.aggregate_partition(
+        datetime.fromisoformat(start),
+        datetime.fromisoformat(end),
+        datetime.fromisoformat(period_start),
+    )
+
+
+@shared_task
+@on_primary
+def finalize_crm_report(partials, report_id):
+    """Merges the partition summaries and stores the report"""
+    report = reports.complete(CRMReport.objects.get(pk=report_id), partials)
+    data = report.data
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    log_message = (
+        f"{timestamp} - Report #{report.pk}: "
+        f"{data['new_customers'] + data['returning_customers']} customers, "
+        f"{data['total_orders']} orders, "
+        f"${Decimal(data['total_revenue']):,.2f} revenue\n"
+    )
+    with open(REPORT_LOG_FILE, "a") as f:
+        f.write(log_message)
+    return report.pk
+
+
+@shared_task
+@on_primary
+def fail_crm_report(request, exc, traceback, report_id):
+    """Marks a report failed when a task of its chord raised"""
+    CRMReport.objects.filter(pk=report_id).update(
+        status=CRMReport.FAILED, completed_at=timezone.now()
+    )
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(REPORT_LOG_FILE, "a") as f:
+        f.write(f"{timestamp} - Report #{report_id} failed: {exc!r}\n")
+
+
+@shared_task
+@on_primary
+def reconcile_dashboard_stats():
+    """Rebuilds the dashboard counters from the source tables"""
+    result = stats.reconcile()
+    logger.info(
+        "Dashboard stats reconciled: %s customers, %s orders, %s revenue",
+        result.total_customers,
+        result.total_orders,
+        result.total_revenue,
+    )
+
+
+@shared_task
+@on_primary
+def cleanup_inactive_customers(days=365, batch_size=500, pause=0):
+    """Deletes customers with no orders in ``days`` days, in batches"""
+    customers = orders = 0
+    for batch in delete_inactive_customers(days, batch_size, pause=pause):
+        customers += batch.customers
+        orders += batch.orders
+        logger.info(
+            "Deleted %s inactive customers and %s orders in %.0f ms",
+            batch.customers,
+            batch.orders,
+            batch.duration * 1000,
+        )
+    logger.info("Cleanup done: %s customers, %s orders deleted", customers, orders)
+    return {"customers": customers, "orders": orders}
 
-        return log_message.strip()
 
-    except Exception as e:
-        error_msg = f"{timestamp} - Report generation failed: {str(e)}\n"
-        with open(log_file, "a") as f:
-            f.write(error_msg)
-        raise self.retry(exc=e, countdown=60)
+@shared_task
+@on_primary
+def refresh_sales_rollup():
+    """Rebuilds the sales rollup for days changed since the last run"""
+    days = rollups.refresh()
+    logger.info("Sales rollup refreshed for %s days", days)
+    return days
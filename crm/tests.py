@@ -1,3 +1,1140 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from crm import (
+    bulk,
+    cron,
+    persisted_queries,
+    reports,
+    rollups,
+    routers,
+    search,
+    tasks,
+)
+from crm.graphql_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GraphQLClientError,
+    HTTPClient,
+)
+from crm.loaders import Loaders
+from crm.models import (
+    CRMReport,
+    Customer,
+    Order,
+    OrderItem,
+    OrderReminder,
+    Product,
+    StaleSalesDay,
+)
+from crm.pagination import encode_cursor
+from crm.persisted_queries import document_cache, query_hash
+from crm.reminders import send_reminders
+from crm.routers import (
+    PRIMARY,
+    REPLICA,
+    STICKY_COOKIE,
+    PrimaryReplicaRouter,
+    PrimaryStickinessMiddleware,
+    RequestState,
+    request_state,
+    use_primary,
+)
+from crm.schema import schema
+from crm.stats import get_stats, reconcile
+
+
+def execute(query, variables=None):
+    context = SimpleNamespace(loaders=Loaders())
+    result = schema.execute(query, variable_values=variables, context_value=context)
+    assert result.errors is None, result.errors
+    return result.data
+
+
+def create_orders(count, prefix="customer"):
+    products = [
+        Product.objects.create(name=f"Product {i}", price="9.99", stock=5)
+        for i in range(3)
+    ]
+    for i in range(count):
+        customer = Customer.objects.create(
+            name=f"{prefix} {i}", email=f"{prefix}{i}@example.com"
+        )
+        order = Order.objects.create(customer=customer, total_amount="29.97")
+        order.products.set(products)
+
+
+class OrdersQueryCountTests(TestCase):
+    query = """
+        query ($days: Int!) {
+            orders(days: $days, first: 50) {
+                edges {
+                    node {
+                        id
+                        customer { id name }
+                        products { id name }
+                    }
+                }
+            }
+        }
+    """
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = execute(self.query, {"days": 30})
+        return len(ctx.captured_queries), data
+
+    def test_query_count_does_not_scale_with_orders(self):
+        create_orders(2)
+        small, data = self.count_queries()
+        self.assertEqual(len(data["orders"]["edges"]), 2)
+
+        create_orders(20, prefix="extra")
+        large, data = self.count_queries()
+        self.assertEqual(len(data["orders"]["edges"]), 22)
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 3)
+
+    def test_selection_drives_column_pruning(self):
+        create_orders(2)
+        with CaptureQueriesContext(connection) as ctx:
+            execute("{ orders(days: 30) { edges { node { id } } } }")
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("total_amount", ctx.captured_queries[0]["sql"])
+
+
+class OrdersPaginationTests(TestCase):
+    query = """
+        query ($first: Int, $after: String) {
+            orders(days: 30, first: $first, after: $after) {
+                edges { node { id } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def test_pages_cover_every_order_once(self):
+        create_orders(7)
+        seen, after = [], None
+        while True:
+            page = execute(self.query, {"first": 3, "after": after})["orders"]
+            seen.extend(edge["node"]["id"] for edge in page["edges"])
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        expected = Order.objects.order_by("-order_date", "-id").values_list(
+            "id", flat=True
+        )
+        self.assertEqual(seen, [str(pk) for pk in expected])
+
+    def test_page_size_is_capped(self):
+        result = schema.execute(
+            self.query,
+            variable_values={"first": 1000},
+            context_value=SimpleNamespace(loaders=Loaders()),
+        )
+        self.assertIn("first", result.errors[0].message)
+
+    def test_malformed_cursor_values_are_rejected(self):
+        # Well-formed JSON lists whose values don't fit the ordering columns.
+        for values in (["xx", 1], [[1], 1]):
+            result = schema.execute(
+                self.query,
+                variable_values={"after": encode_cursor(values)},
+                context_value=SimpleNamespace(loaders=Loaders()),
+            )
+            self.assertEqual(result.errors[0].message, "Invalid cursor.")
+
+
+class DashboardStatsTests(TestCase):
+    query = "{ totalCustomers totalOrders totalRevenue }"
+
+    def test_counters_follow_writes(self):
+        create_orders(3)
+        order = Order.objects.first()
+        order.total_amount = "10.00"
+        order.save()
+        Customer.objects.filter(pk=Order.objects.last().customer_id).delete()
+
+        data = execute(self.query)
+        self.assertEqual(
+            data, {"totalCustomers": 2, "totalOrders": 2, "totalRevenue": 39.97}
+        )
+        counted = get_stats()
+        fresh = reconcile()
+        self.assertEqual(
+            (counted.total_customers, counted.total_orders, counted.total_revenue),
+            (fresh.total_customers, fresh.total_orders, fresh.total_revenue),
+        )
+
+    def test_counters_are_a_single_read(self):
+        create_orders(3)
+        with CaptureQueriesContext(connection) as ctx:
+            execute("{ totalRevenue }")
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class ResponseCacheTests(TestCase):
+    query = "{ totalOrders totalRevenue }"
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query):
+        response = self.client.post(
+            "/graphql",
+            data=json.dumps({"query": query}),
+            content_type="application/json",
+        )
+        return response.json()["data"]
+
+    def test_cached_until_a_write(self):
+        create_orders(2)
+        self.assertEqual(self.post(self.query)["totalOrders"], 2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.post(self.query)["totalOrders"], 2)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.first().delete()
+        self.assertEqual(self.post(self.query)["totalOrders"], 1)
+
+        # Not every root field is cacheable, so neither is the operation.
+        mixed = "{ totalOrders allProducts { edges { node { id } } } }"
+        self.post(mixed)
+        with CaptureQueriesContext(connection) as ctx:
+            self.post(mixed)
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+    def test_responses_to_be_cached_are_read_from_the_primary(self):
+        create_orders(1)
+        routed = []
+
+        def db_for_read(router, model, **hints):
+            # Record the router's choice, but run every query on the test
+            # database, outside of which the test transaction isn't seen.
+            routed.append(routers.read_database())
+            return PRIMARY
+
+        outside_transaction = {PRIMARY: SimpleNamespace(in_atomic_block=False)}
+        replica = {REPLICA: settings.DATABASES[PRIMARY]}
+        with (
+            mock.patch.dict(settings.DATABASES, replica),
+            mock.patch.object(routers, "connections", outside_transaction),
+            mock.patch.object(PrimaryReplicaRouter, "db_for_read", db_for_read),
+        ):
+            self.assertEqual(self.post(self.query)["totalOrders"], 1)
+            self.assertEqual(set(routed), {PRIMARY})
+
+            routed.clear()
+            self.post("{ allProducts { edges { node { id } } } }")
+            self.assertEqual(set(routed), {REPLICA})
+
+
+class DatabaseRouterTests(SimpleTestCase):
+    def test_reads_use_the_replica_until_the_request_writes(self):
+        router = PrimaryReplicaRouter()
+        replica = {REPLICA: settings.DATABASES[PRIMARY]}
+        with mock.patch.dict(settings.DATABASES, replica):
+            self.assertEqual(router.db_for_read(Customer), REPLICA)
+            with use_primary():
+                self.assertEqual(router.db_for_read(Customer), PRIMARY)
+
+            token = request_state.set(RequestState(pinned=False))
+            try:
+                self.assertEqual(router.db_for_read(Customer), REPLICA)
+                self.assertEqual(router.db_for_write(Customer), PRIMARY)
+                self.assertEqual(router.db_for_read(Customer), PRIMARY)
+            finally:
+                request_state.reset(token)
+
+
+class PrimaryStickinessTests(TestCase):
+    def test_writes_pin_the_client_to_the_primary(self):
+        def post(query):
+            return self.client.post(
+                "/graphql",
+                data=json.dumps({"query": query}),
+                content_type="application/json",
+            )
+
+        self.assertNotIn(STICKY_COOKIE, post("{ hello }").cookies)
+        Product.objects.create(name="Pen", price="1.00", stock=0)
+        response = post("mutation { updateLowStockProducts { success } }")
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 5)
+
+    def test_middleware_stays_async_under_asgi(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(PrimaryStickinessMiddleware(view)))
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite only")
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_and_immediate_transactions(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+class UpdateLowStockProductsTests(TestCase):
+    def test_restocks_only_low_stock_products(self):
+        Product.objects.create(name="Low", price="1.00", stock=2)
+        Product.objects.create(name="Full", price="1.00", stock=50)
+        data = execute("""
+            mutation {
+                updateLowStockProducts(restockAmount: 5) { success updatedProducts }
+            }
+            """)
+        self.assertEqual(data["updateLowStockProducts"]["updatedProducts"], ["Low (7)"])
+        self.assertEqual(Product.objects.get(name="Full").stock, 50)
+
+
+class PersistedQueryTests(TestCase):
+    query = "{ hello }"
+
+    def setUp(self):
+        document_cache.clear()
+
+    def post(self, body):
+        return self.client.post(
+            "/graphql", data=json.dumps(body), content_type="application/json"
+        ).json()
+
+    def test_automatic_persisted_query_handshake(self):
+        extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": query_hash(self.query)}
+        }
+        miss = self.post({"extensions": extensions})
+        self.assertEqual(
+            miss["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND"
+        )
+
+        registered = self.post({"query": self.query, "extensions": extensions})
+        self.assertEqual(registered["data"], {"hello": "Hello, GraphQL!"})
+
+        replayed = self.post({"extensions": extensions})
+        self.assertEqual(replayed["data"], {"hello": "Hello, GraphQL!"})
+        self.assertEqual(document_cache.stats()["hits"], 1)
+        self.assertEqual(document_cache.stats()["misses"], 1)
+
+    @override_settings(GRAPHQL_PERSISTED_QUERY_MAX_LENGTH=10)
+    def test_long_documents_run_without_being_registered(self):
+        query = "{ hello  }"
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.post({"query": query, "extensions": extensions})
+        self.assertIn(
+            mock.call(
+                persisted_queries.REGISTRY_PREFIX + query_hash(query),
+                query,
+                timeout=persisted_queries.REGISTRY_TTL,
+            ),
+            cache_set.call_args_list,
+        )
+
+        query = "{ hello   }"
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+        registered = self.post({"query": query, "extensions": extensions})
+        self.assertEqual(registered["data"], {"hello": "Hello, GraphQL!"})
+        miss = self.post({"extensions": extensions})
+        self.assertEqual(
+            miss["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND"
+        )
+
+
+class QueryCostTests(TestCase):
+    def post(self, query):
+        return self.client.post(
+            "/graphql",
+            data=json.dumps({"query": query}),
+            content_type="application/json",
+        )
+
+    def test_cost_is_reported_in_extensions(self):
+        body = self.post(
+            "{ orders(days: 7, first: 10) { edges { node { id customer { name } } } } }"
+        ).json()
+        # orders (2) + 10 x (edges 1 + node 1 + customer 1)
+        self.assertEqual(body["extensions"]["cost"]["requested"], 32)
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=1000)
+    def test_expensive_documents_are_rejected(self):
+        # orders (2) + 100 x (edges 1 + node 1 + 10 x products 1) = 1202
+        response = self.post(
+            "{ orders(days: 7, first: 100) { edges { node { products { id } } } } }"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"][0]["message"],
+            "Query cost 1202 exceeds the maximum of 1000.",
+        )
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=1000)
+    def test_negative_page_sizes_do_not_offset_siblings(self):
+        selection = "{ edges { node { products { id } } } }"
+        response = self.post(
+            f"{{ a: orders(days: 7, first: 100) {selection} "
+            f"b: orders(days: 7, first: -100) {selection} }}"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncEndpointTests(TestCase):
+    async def post(self, query):
+        response = await self.async_client.post(
+            "/graphql/async",
+            data=json.dumps({"query": query}),
+            content_type="application/json",
+        )
+        return response.json()
+
+    async def test_queries_resolve_on_the_event_loop(self):
+        await sync_to_async(create_orders)(3)
+        body = await self.post("""
+            {
+                totalCustomers
+                totalOrders
+                orders(days: 7) { edges { node { customer { name } products { id } } } }
+            }
+            """)
+        self.assertNotIn("errors", body)
+        self.assertEqual(body["data"]["totalCustomers"], 3)
+        self.assertEqual(body["data"]["totalOrders"], 3)
+        self.assertEqual(len(body["data"]["orders"]["edges"]), 3)
+
+    async def test_mutations_run_in_a_worker_thread(self):
+        await Product.objects.acreate(name="Low", price="1.00", stock=1)
+        body = await self.post(
+            "mutation { updateLowStockProducts { updatedProducts } }"
+        )
+        self.assertEqual(
+            body["data"]["updateLowStockProducts"]["updatedProducts"], ["Low (11)"]
+        )
+
+
+class InstrumentationTests(TestCase):
+    query = "{ orders(days: 7) { edges { node { customer { name } } } } }"
+
+    def test_debug_header_returns_per_field_timings(self):
+        create_orders(3)
+        body = self.client.post(
+            "/graphql",
+            data=json.dumps({"query": self.query}),
+            content_type="application/json",
+            HTTP_X_GRAPHQL_DEBUG="1",
+        ).json()
+        timing = body["extensions"]["timing"]
+        sql_by_field = {}
+        for record in timing["resolvers"]:
+            sql_by_field.setdefault(record["field"], 0)
+            sql_by_field[record["field"]] += record["sqlCount"]
+        self.assertEqual(sql_by_field["Query.orders"], 1)
+        self.assertEqual(sql_by_field["OrderType.customer"], 0)
+        self.assertNotIn("CustomerType.name", sql_by_field)
+
+        body = self.client.post(
+            "/graphql",
+            data=json.dumps({"query": self.query}),
+            content_type="application/json",
+        ).json()
+        self.assertNotIn("timing", body["extensions"])
+        metrics = self.client.get("/metrics").content.decode()
+        self.assertIn(
+            'graphql_resolver_duration_seconds_count{field="Query.orders"}', metrics
+        )
+        self.assertIn(
+            'graphql_resolver_duration_seconds_count{field="OrderType.customer"}',
+            metrics,
+        )
+        self.assertNotIn('field="CustomerType.name"', metrics)
+
+
+@override_settings(CRM_GRAPHQL_TRANSPORT="local")
+class CronJobTests(TestCase):
+    def log_file(self, name):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return Path(directory.name) / name
+
+    def test_heartbeat_queries_the_schema_in_process(self):
+        path = self.log_file("heartbeat.txt")
+        with mock.patch.object(cron, "HEARTBEAT_LOG_FILE", str(path)):
+            cron.log_crm_heartbeat()
+
+        alive, responsive = path.read_text().splitlines()
+        self.assertTrue(alive.endswith(" CRM is alive"))
+        self.assertTrue(
+            responsive.endswith(" GraphQL endpoint responsive: Hello, GraphQL!")
+        )
+
+    def test_update_low_stock_restocks_in_process(self):
+        low = Product.objects.create(name="Low", price="1.00", stock=3)
+        full = Product.objects.create(name="Full", price="1.00", stock=50)
+        path = self.log_file("low_stock.txt")
+        with mock.patch.object(cron, "LOW_STOCK_LOG_FILE", str(path)):
+            with mock.patch("sys.stdout", new_callable=StringIO):
+                cron.update_low_stock()
+
+        low.refresh_from_db()
+        full.refresh_from_db()
+        self.assertEqual((low.stock, full.stock), (13, 50))
+        self.assertTrue(
+            path.read_text().endswith(
+                " - Stock updated for low-stock products. | Products: Low (13)\n"
+            )
+        )
+
+
+class OrderTotalTests(TestCase):
+    def test_totals_follow_product_changes(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        cheap = Product.objects.create(name="Cheap", price="2.50")
+        dear = Product.objects.create(name="Dear", price="10.00")
+        order = Order.objects.create(customer=customer, total_amount=0)
+
+        order.products.add(cheap, dear)
+        self.assertEqual(order.total_amount, Decimal("12.50"))
+        dear.order_set.remove(order)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal("2.50"))
+        self.assertEqual(order.calculate_total(), Decimal("2.50"))
+        self.assertEqual(get_stats().total_revenue, Decimal("2.50"))
+
+    def test_totals_follow_item_writes(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        pen = Product.objects.create(name="Pen", price="10.00")
+        ink = Product.objects.create(name="Ink", price="5.00")
+        order = Order.objects.create(customer=customer, total_amount=0)
+
+        item = OrderItem.objects.create(order=order, product=pen, quantity=3)
+        order.items.create(product=ink, quantity=1)
+        item.quantity = 5
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal("55.00"))
+        self.assertEqual(get_stats().total_revenue, Decimal("55.00"))
+
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal("5.00"))
+        order.delete()
+        self.assertEqual(get_stats().total_revenue, Decimal("0"))
+
+    def test_backfill_command(self):
+        create_orders(3)
+        Order.objects.update(total_amount=0)
+        call_command("recompute_order_totals", chunk_size=2, stdout=StringIO())
+        self.assertEqual(
+            list(Order.objects.values_list("total_amount", flat=True)),
+            [Decimal("29.97")] * 3,
+        )
+
+
+class BulkCreateOrdersTests(TestCase):
+    mutation = """
+        mutation ($orders: [BulkOrderInput!]!) {
+            bulkCreateOrders(orders: $orders) {
+                orders { id customer { name } products { name } }
+                errors { index message }
+            }
+        }
+    """
+
+    def test_creates_valid_orders_and_reports_the_rest(self):
+        ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        pen = Product.objects.create(name="Pen", price="1.50", stock=5)
+        ink = Product.objects.create(name="Ink", price="4.00", stock=1)
+        orders = [
+            {"customerId": ada.pk, "items": [{"productId": pen.pk, "quantity": 2}]},
+            {"customerId": 999, "items": [{"productId": pen.pk}]},
+            {
+                "customerId": ada.pk,
+                "items": [{"productId": pen.pk}, {"productId": ink.pk}],
+            },
+            {"customerId": ada.pk, "items": [{"productId": ink.pk}]},
+            {"customerId": ada.pk, "items": [{"productId": pen.pk, "quantity": None}]},
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = execute(self.mutation, {"orders": orders})["bulkCreateOrders"]
+        self.assertLessEqual(len(ctx.captured_queries), 12)
+
+        self.assertEqual(len(data["orders"]), 2)
+        self.assertEqual(data["orders"][1]["customer"]["name"], "Ada")
+        self.assertEqual([e["index"] for e in data["errors"]], [1, 3, 4])
+        pen.refresh_from_db()
+        ink.refresh_from_db()
+        self.assertEqual((pen.stock, ink.stock), (2, 0))
+        self.assertEqual(
+            sorted(Order.objects.values_list("total_amount", flat=True)),
+            [Decimal("3.00"), Decimal("5.50")],
+        )
+        self.assertEqual(get_stats().total_revenue, Decimal("8.50"))
+
+
+class ImportCustomersTests(TestCase):
+    def test_imports_in_chunks_and_reports_bad_rows(self):
+        Customer.objects.create(name="Ada", email="ada@example.com")
+        rows = [
+            {"name": "Ada", "email": "ada@example.com"},
+            {"name": "Bob", "email": "bob@example.com", "phone": "+1555"},
+            {"name": "Cy", "email": "not-an-email"},
+            {"name": "Bob again", "email": "bob@example.com"},
+            {"name": "Dee", "email": "dee@example.com"},
+            {"name": "Eve", "email": "eve@example.com", "phone": 2348011},
+            {"name": 5, "email": "five@example.com"},
+            {"name": "x" * 101, "email": "long@example.com"},
+            {"name": "Fay", "email": "f" * 250 + "@example.com"},
+        ]
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "customers.jsonl"
+        path.write_text("\n".join(map(json.dumps, rows)) + "\n{oops\n")
+
+        err = StringIO()
+        call_command(
+            "import_customers", str(path), chunk_size=2, stdout=StringIO(), stderr=err
+        )
+
+        self.assertEqual(
+            sorted(Customer.objects.values_list("email", flat=True)),
+            ["ada@example.com", "bob@example.com", "dee@example.com"],
+        )
+        self.assertEqual(
+            [line.split(":")[0] for line in err.getvalue().splitlines()],
+            ["Row 1", "Row 3", "Row 4"] + [f"Row {row}" for row in range(6, 11)],
+        )
+        self.assertEqual(get_stats().total_customers, 3)
+
+    def test_rows_taken_by_a_concurrent_import_are_not_counted(self):
+        insert = bulk.insert_customers
+
+        def race(pending, errors):
+            # Another import commits bob@ between the lookup and the insert.
+            Customer.objects.create(name="Bob", email="bob@example.com")
+            return insert(pending, errors)
+
+        rows = [
+            {"name": "Ada", "email": "ada@example.com"},
+            {"name": "Bob", "email": "bob@example.com"},
+        ]
+        with mock.patch.object(bulk, "insert_customers", race):
+            created, errors = bulk.create_customers(rows)
+
+        self.assertEqual([customer.name for customer in created], ["Ada"])
+        self.assertEqual([error.index for error in errors], [1])
+        self.assertEqual(get_stats().total_customers, 2)
+
+
+class ExportTests(TestCase):
+    @override_settings(CRM_EXPORT_TOKEN="secret")
+    def test_streams_filtered_orders(self):
+        create_orders(3)
+        order = Order.objects.order_by("id").last()
+        Order.objects.filter(pk=order.pk).update(total_amount=Decimal("100.00"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/export/orders.jsonl",
+                {"total_amount__gte": "50"},
+                HTTP_AUTHORIZATION="Bearer secret",
+            )
+            lines = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line)["id"] for line in lines], [order.pk])
+        self.assertEqual(len(json.loads(lines[0])["items"]), 3)
+        self.assertEqual(len(queries), 2)
+
+        out = StringIO()
+        call_command("export", "orders", "--format", "csv", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1 + 3 * 3)
+
+        response = self.client.get(
+            "/export/customers.csv", HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        response = self.client.get("/export/orders.csv", {"total_amount__gte": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SeedCRMTests(TestCase):
+    def test_seeds_consistent_data(self):
+        call_command(
+            "seed_crm", customers=20, products=5, orders=50, days=30, stdout=StringIO()
+        )
+
+        self.assertEqual(
+            (Customer.objects.count(), Product.objects.count(), Order.objects.count()),
+            (20, 5, 50),
+        )
+        order = Order.objects.order_by("order_date").first()
+        self.assertGreater(order.order_date, timezone.now() - timedelta(days=30))
+        self.assertEqual(order.total_amount, order.calculate_total())
+        stats = get_stats()
+        self.assertEqual((stats.total_customers, stats.total_orders), (20, 50))
+
+
+class FilteredConnectionTests(TestCase):
+    def test_all_orders_filters_and_pages(self):
+        create_orders(5)
+        Order.objects.filter(pk__lte=2).update(total_amount="5.00")
+        query = """
+            query ($after: String) {
+                allOrders(first: 2, after: $after, totalAmount_Gte: "10",
+                          productName: "product 1") {
+                    edges { node { id customer { name } } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+
+        with CaptureQueriesContext(connection) as ctx:
+            page = execute(query)["allOrders"]
+        self.assertEqual(len(ctx.captured_queries), 1)
+        after = page["pageInfo"]["endCursor"]
+        rest = execute(query, {"after": after})["allOrders"]
+
+        ids = [edge["node"]["id"] for edge in page["edges"] + rest["edges"]]
+        self.assertEqual(ids, ["5", "4", "3"])
+        self.assertFalse(rest["pageInfo"]["hasNextPage"])
+
+    def test_all_customers_phone_prefix(self):
+        for i, phone in enumerate(["+2348011", "+2349022", "+1555", None]):
+            Customer.objects.create(name=f"C{i}", email=f"c{i}@x.io", phone=phone)
+
+        data = execute(
+            '{ allCustomers(phonePattern: "+234") { edges { node { name } } } }'
+        )
+        names = [edge["node"]["name"] for edge in data["allCustomers"]["edges"]]
+        self.assertEqual(names, ["C1", "C0"])
+
+
+class SearchTests(TestCase):
+    query = """
+        query ($query: String!, $after: String) {
+            search(query: $query, first: 2, after: $after) {
+                edges {
+                    node {
+                        __typename
+                        ... on CustomerType { name }
+                        ... on ProductType { name }
+                        ... on OrderType { id customer { name } }
+                    }
+                }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def names(self, query, after=None):
+        data = execute(self.query, {"query": query, "after": after})["search"]
+        nodes = [edge["node"] for edge in data["edges"]]
+        names = [node.get("name") or f"order {node['id']}" for node in nodes]
+        return names, data["pageInfo"]
+
+    def test_signals_keep_the_index_current(self):
+        create_orders(1, prefix="ada")
+        grace = Customer.objects.create(name="Grace Hopper", email="gh@navy.mil")
+        self.assertEqual(self.names("hop nav")[0], ["Grace Hopper"])
+
+        grace.name = "Grace Brewster"
+        grace.save()
+        self.assertEqual(self.names("hopper")[0], [])
+
+        product = Product.objects.get(name="Product 1")
+        product.name = "Widget"
+        product.save()
+        self.assertEqual(self.names("widg")[0], ["Widget", "order 1"])
+
+        grace.delete()
+        self.assertEqual(self.names("grace")[0], [])
+
+    def test_pages_through_ranked_results(self):
+        bulk_create = """
+            mutation ($customers: [CustomerInput!]!) {
+                bulkCreateCustomers(customers: $customers) { errors { index } }
+            }
+        """
+        customers = [
+            {"name": f"Lovelace {i}", "email": f"ada{i}@example.com"} for i in range(3)
+        ]
+        execute(bulk_create, {"customers": customers})
+
+        first, page_info = self.names("lovelace")
+        self.assertTrue(page_info["hasNextPage"])
+        rest, page_info = self.names("lovelace", page_info["endCursor"])
+        self.assertFalse(page_info["hasNextPage"])
+        self.assertEqual(
+            sorted(first + rest), ["Lovelace 0", "Lovelace 1", "Lovelace 2"]
+        )
+
+
+class CleanupInactiveCustomersTests(TestCase):
+    def test_deletes_only_customers_whose_last_order_is_old(self):
+        create_orders(5)
+        Customer.objects.create(name="Never ordered", email="new@example.com")
+        old = timezone.now() - timedelta(days=400)
+        Order.objects.filter(customer__name__in=["customer 0", "customer 1"]).update(
+            order_date=old
+        )
+        recent = Order.objects.create(
+            customer=Customer.objects.get(name="customer 2"), total_amount="1.00"
+        )
+        Order.objects.filter(customer__name="customer 2").exclude(pk=recent.pk).update(
+            order_date=old
+        )
+
+        out = StringIO()
+        call_command("cleanup_inactive_customers", dry_run=True, stdout=out)
+        self.assertIn("Would delete 2 inactive customers and 2 orders", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 6)
+
+        call_command("cleanup_inactive_customers", batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(Customer.objects.values_list("name", flat=True)),
+            ["Never ordered", "customer 2", "customer 3", "customer 4"],
+        )
+        stats = get_stats()
+        self.assertEqual(
+            (stats.total_customers, stats.total_orders, stats.total_revenue),
+            (4, 4, Decimal("90.91")),
+        )
+        self.assertEqual(search.search("customer0", 10), [])
+
+
+class OrderRemindersTests(TestCase):
+    def test_sends_each_reminder_once(self):
+        create_orders(5)
+        Order.objects.filter(customer__name="customer 0").update(
+            order_date=timezone.now() - timedelta(days=30)
+        )
+        notified = []
+
+        def notify(order):
+            if order["customer"]["email"] == "customer3@example.com":
+                raise RuntimeError("mailbox full")
+            notified.append(order["customer"]["email"])
+
+        pages = list(send_reminders(notify, page_size=2, workers=2))
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(sum(len(page.sent) for page in pages), 3)
+        self.assertEqual(
+            [order["id"] for page in pages for order, _ in page.failed], ["4"]
+        )
+
+        pages = list(send_reminders(notify, page_size=2, workers=2))
+        self.assertEqual(sum(page.skipped for page in pages), 3)
+        self.assertEqual(len(notified), 3)
+        self.assertEqual(OrderReminder.objects.count(), 3)
+
+
+class CRMReportTests(TestCase):
+    def test_partitioned_report_matches_a_single_pass(self):
+        now = timezone.now()
+        products = [
+            Product.objects.create(name=f"P{i}", price=price, stock=100)
+            for i, price in enumerate(["5.00", "7.50", "20.00"])
+        ]
+        customers = [
+            Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+            for i in range(4)
+        ]
+        # (customer, days ago, products); C0 first ordered before the period.
+        history = [
+            (0, 40, [0]),
+            (0, 20, [0, 1]),
+            (1, 19, [2]),
+            (0, 9, [1]),
+            (2, 8, [0, 2]),
+            (1, 2, [1]),
+            (3, 1, [2]),
+        ]
+        for customer, days_ago, bought in history:
+            order = Order.objects.create(customer=customers[customer], total_amount=0)
+            order.products.set(products[i] for i in bought)
+            Order.objects.filter(pk=order.pk).update(
+                order_date=now - timedelta(days=days_ago)
+            )
+
+        def report(partition_days):
+            return reports.run(
+                CRMReport.objects.create(
+                    period_start=now - timedelta(days=30), period_end=now
+                ),
+                partition_days,
+            )
+
+        single, partitioned = report(30), report(3)
+        self.assertEqual(partitioned.data, single.data)
+        self.assertEqual(
+            (single.data["new_customers"], single.data["returning_customers"]),
+            (3, 1),
+        )
+        self.assertEqual(single.data["total_revenue"], "92.50")
+
+        data = execute("""{ crmReport { id data { totalOrders
+                 topProducts { name revenue } topCustomers { name } } } }""")[
+            "crmReport"
+        ]
+        self.assertEqual(data["id"], str(partitioned.pk))
+        self.assertEqual(data["data"]["totalOrders"], 6)
+        self.assertEqual(
+            data["data"]["topProducts"][0], {"name": "P2", "revenue": "60.00"}
+        )
+        self.assertEqual(data["data"]["topCustomers"][0]["name"], "C1")
+
+    @mock.patch.object(reports, "TOP", 1)
+    def test_top_customers_sum_across_partitions(self):
+        now = timezone.now()
+        # C1 never leads a partition but spends the most over the period.
+        for name, days_ago, total in [
+            ("C0", 5, "10.00"),
+            ("C1", 5, "9.00"),
+            ("C1", 2, "9.00"),
+            ("C2", 2, "10.00"),
+        ]:
+            customer, _ = Customer.objects.get_or_create(
+                name=name, email=f"{name}@example.com"
+            )
+            order = Order.objects.create(customer=customer, total_amount=total)
+            Order.objects.filter(pk=order.pk).update(
+                order_date=now - timedelta(days=days_ago)
+            )
+
+        report = reports.run(
+            CRMReport.objects.create(
+                period_start=now - timedelta(days=6), period_end=now
+            ),
+            3,
+        )
+        self.assertEqual(
+            [(row["name"], row["revenue"]) for row in report.data["top_customers"]],
+            [("C1", "18.00")],
+        )
+
+
+class CRMReportTaskTests(TestCase):
+    def test_weekly_report_fans_out_per_day_and_fails_visibly(self):
+        with mock.patch.object(tasks, "chord") as chord:
+            report_id = tasks.generate_crm_report()
+        (header,), _ = chord.call_args
+        (callback,), _ = chord.return_value.call_args
+        self.assertEqual(len(header), 7)
+        self.assertEqual(
+            callback.options["link_error"], [tasks.fail_crm_report.s(report_id)]
+        )
+
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "report.txt"
+        with mock.patch.object(tasks, "REPORT_LOG_FILE", str(path)):
+            tasks.fail_crm_report(None, ValueError("boom"), None, report_id)
+        self.assertEqual(CRMReport.objects.get(pk=report_id).status, CRMReport.FAILED)
+        self.assertTrue(
+            path.read_text().endswith(
+                f"Report #{report_id} failed: ValueError('boom')\n"
+            )
+        )
+
+
+class SalesRollupTests(TestCase):
+    query = """
+        query ($from: Date!, $to: Date!) {
+            salesByDay(from: $from, to: $to) { day orders units revenue }
+            salesByProduct(from: $from, to: $to, period: MONTH) {
+                productName orders units revenue
+            }
+        }
+    """
+
+    def sales(self):
+        today = timezone.localdate()
+        variables = {
+            "from": (today - timedelta(days=60)).isoformat(),
+            "to": today.isoformat(),
+        }
+        return execute(self.query, variables)
+
+    def test_refresh_tracks_new_changed_and_deleted_orders(self):
+        create_orders(3)
+        Order.objects.filter(pk=1).update(
+            order_date=timezone.now() - timedelta(days=40)
+        )
+        self.assertEqual(rollups.refresh(), 2)
+        data = self.sales()
+        self.assertEqual(
+            [
+                (day["orders"], day["units"], day["revenue"])
+                for day in data["salesByDay"]
+            ],
+            [(1, 3, "29.97"), (2, 6, "59.94")],
+        )
+
+        Order.objects.get(pk=2).products.remove(Product.objects.get(name="Product 0"))
+        Order.objects.get(pk=1).delete()
+        rollups.refresh()
+        data = self.sales()
+        self.assertEqual(
+            [
+                (day["orders"], day["units"], day["revenue"])
+                for day in data["salesByDay"]
+            ],
+            [(2, 5, "49.95")],
+        )
+        self.assertEqual(
+            data["salesByProduct"],
+            [
+                {
+                    "productName": "Product 0",
+                    "orders": 1,
+                    "units": 1,
+                    "revenue": "9.99",
+                },
+                {
+                    "productName": "Product 1",
+                    "orders": 2,
+                    "units": 2,
+                    "revenue": "19.98",
+                },
+                {
+                    "productName": "Product 2",
+                    "orders": 2,
+                    "units": 2,
+                    "revenue": "19.98",
+                },
+            ],
+        )
+        self.assertFalse(StaleSalesDay.objects.exists())
+
+        Product.objects.get(name="Product 0").delete()
+        self.assertTrue(StaleSalesDay.objects.exists())
+        rollups.refresh()
+        data = self.sales()
+        self.assertEqual(
+            [
+                (day["orders"], day["units"], day["revenue"])
+                for day in data["salesByDay"]
+            ],
+            [(2, 4, "39.96")],
+        )
+        self.assertEqual(get_stats().total_revenue, Decimal("39.96"))
+
+
+class GraphQLClientTests(TestCase):
+    def test_backs_off_then_opens_circuit(self):
+        calls = []
+
+        class Session:
+            def execute(self, document, variable_values=None):
+                calls.append(document)
+                raise requests.ConnectionError("refused")
+
+        client = HTTPClient(
+            "http://api.invalid/graphql",
+            timeout=1,
+            retries=2,
+            backoff=1,
+            backoff_max=3,
+            breaker=CircuitBreaker(threshold=3, reset_timeout=60),
+        )
+        client.session = Session()
+        with mock.patch("crm.graphql_client.time.sleep") as sleep:
+            with self.assertRaises(GraphQLClientError):
+                client.execute("query { hello }")
+            with self.assertRaises(CircuitOpenError):
+                client.execute("query { hello }")
+
+        self.assertEqual(len(calls), 3)
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[0], 1)
+        self.assertLessEqual(delays[1], 2)
+
+    def test_mutations_are_only_retried_when_never_sent(self):
+        calls = []
+
+        class Session:
+            def __init__(self, error):
+                self.error = error
+
+            def execute(self, document, variable_values=None):
+                calls.append(document)
+                raise self.error
+
+        client = HTTPClient(
+            "http://api.invalid/graphql",
+            timeout=1,
+            retries=2,
+            backoff=1,
+            backoff_max=1,
+            breaker=CircuitBreaker(threshold=10, reset_timeout=60),
+        )
+        mutation = "mutation { updateLowStockProducts { success } }"
+        with mock.patch("crm.graphql_client.time.sleep"):
+            # The server may have restocked before the response timed out.
+            client.session = Session(requests.ReadTimeout("read timed out"))
+            with self.assertRaises(GraphQLClientError):
+                client.execute(mutation)
+            self.assertEqual(len(calls), 1)
+
+            client.session = Session(requests.ConnectTimeout("connect timed out"))
+            with self.assertRaises(GraphQLClientError):
+                client.execute(mutation)
+            self.assertEqual(len(calls), 4)
+
+    def test_trial_call_failing_on_a_bad_request_is_released(self):
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 60.0
+
+        class Session:
+            def __init__(self, error):
+                self.error = error
+
+            def execute(self, document, variable_values=None):
+                if self.error:
+                    raise self.error
+                return {"hello": "hi"}
+
+        client = HTTPClient(
+            "http://api.invalid/graphql",
+            timeout=1,
+            retries=0,
+            backoff=1,
+            backoff_max=1,
+            breaker=breaker,
+        )
+        client.session = Session(ValueError("bad document"))
+        with self.assertRaises(ValueError):
+            client.execute("query { hello }")
+
+        client.session = Session(None)
+        self.assertEqual(client.execute("query { hello }"), {"hello": "hi"})
+        self.assertIsNone(breaker.opened_at)
@@ -1,3 +1,352 @@
-from django.shortcuts import render
+import hmac
+import json
+from contextlib import nullcontext
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    OperationType,
+    execute,
+    get_operation_ast,
+    specified_rules,
+)
+
+from crm import exports, persisted_queries, response_cache
+from crm.cost import CostLimitRule, operation_cost, setting
+from crm.instrumentation import metrics, record_request
+from crm.loaders import Loaders
+from crm.persisted_queries import document_cache, query_hash
+from crm.routers import use_primary
+
+
+class EarlyResult(Exception):
+    """Short-circuits a request with ``result`` before execution."""
+
+    def __init__(self, result):
+        self.result = result
+
+
+class CRMGraphQLView(GraphQLView):
+    document_cache = document_cache
+    validation_rules = (*specified_rules, CostLimitRule)
+
+    def get_context(self, request):
+        # Fresh loaders per request so batched lookups never leak across users.
+        request.loaders = Loaders()
+        return request
+
+    @staticmethod
+    def add_extension(request, key, value):
+        if not hasattr(request, "graphql_extensions"):
+            request.graphql_extensions = {}
+        request.graphql_extensions[key] = value
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = getattr(request, "graphql_extensions", None)
+        if extensions:
+            d = {**d, "extensions": extensions}
+        return super().json_encode(request, d, pretty)
+
+    def report_cost(self, request, cached, operation_ast):
+        key = operation_ast.name.value if operation_ast.name else None
+        if key not in cached.costs:
+            cached.costs[key] = operation_cost(
+                self.schema.graphql_schema, cached.document, operation_ast
+            )
+        cost, depth = cached.costs[key]
+        self.add_extension(
+            request,
+            "cost",
+            {
+                "requested": cost,
+                "maximum": setting("GRAPHQL_MAX_QUERY_COST", 5000),
+                "depth": depth,
+            },
+        )
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions
+
+    def prepare_document(self, request, data, query, operation_name, show_graphiql):
+        """Resolve, parse and validate the request's document.
+
+        Returns ``(document, operation_ast, document_hash)``; raises
+        ``EarlyResult`` when the request is answered without executing
+        anything.
+        """
+        try:
+            query = persisted_queries.resolve(query, self.get_extensions(request, data))
+        except persisted_queries.PersistedQueryError as e:
+            raise EarlyResult(ExecutionResult(errors=[e]))
+
+        if not query:
+            if show_graphiql:
+                raise EarlyResult(None)
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        cached = self.document_cache.get(schema, query, self.validation_rules)
+        if cached.errors:
+            raise EarlyResult(ExecutionResult(data=None, errors=cached.errors))
+
+        document = cached.document
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                raise EarlyResult(None)
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if operation_ast is not None:
+            self.report_cost(request, cached, operation_ast)
+        return document, operation_ast, query_hash(query)
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def execute_document(
+        self, request, document, operation_ast, variables, operation_name
+    ):
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = self.get_execute_options(
+                request, variables, operation_name
+            )
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+            ):
+                # Mutations read what they are about to change; keep those
+                # reads off the replica.
+                with use_primary():
+                    return self.execute_mutation(request, document, execute_options)
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def execute_mutation(self, request, document, execute_options):
+        schema = self.schema.graphql_schema
+        if (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = execute(schema, document, **execute_options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+        return execute(schema, document, **execute_options)
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # Mirrors GraphQLView.execute_graphql_request, with persisted query
+        # lookup and parse/validate served from the document cache.
+        with record_request(request):
+            try:
+                document, operation_ast, document_hash = self.prepare_document(
+                    request, data, query, operation_name, show_graphiql
+                )
+            except EarlyResult as early:
+                return early.result
+            entry, cached_data = response_cache.lookup(
+                request, document_hash, operation_ast, operation_name, variables
+            )
+            if cached_data is not None:
+                return ExecutionResult(data=cached_data)
+            # A lagging replica could put pre-write data under the version a
+            # write just bumped to, so responses to be cached read the primary.
+            with use_primary() if entry is not None else nullcontext():
+                result = self.execute_document(
+                    request, document, operation_ast, variables, operation_name
+                )
+            if entry is not None and not result.errors:
+                entry.store(result.data)
+            return result
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """Serves the schema from the event loop; mount it under ASGI.
+
+    Queries execute on the loop, so independent root fields with async
+    resolvers run concurrently. Mutations are ordinary sync code and run in
+    a worker thread, inside a transaction exactly as in ``CRMGraphQLView``.
+    GraphiQL and batching are only offered by the sync view.
+    """
+
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # csrf_exempt() wraps views in a sync function on Django 4.2, which
+        # would hide the coroutine from the handler.
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            result, status_code = await self.get_response_async(request, data)
+            return HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            )
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+            return response
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        with record_request(request):
+            execution_result = await self.execute_graphql_request_async(
+                request, data, query, variables, operation_name
+            )
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        return self.json_encode(request, response), status_code
+
+    async def execute_graphql_request_async(
+        self, request, data, query, variables, operation_name
+    ):
+        try:
+            document, operation_ast, document_hash = self.prepare_document(
+                request, data, query, operation_name, show_graphiql=False
+            )
+        except EarlyResult as early:
+            return early.result
+
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return await sync_to_async(self.execute_document)(
+                request, document, operation_ast, variables, operation_name
+            )
+
+        # Reading the user and a Redis-backed cache are blocking calls.
+        entry, cached_data = await sync_to_async(response_cache.lookup)(
+            request, document_hash, operation_ast, operation_name, variables
+        )
+        if cached_data is not None:
+            return ExecutionResult(data=cached_data)
+
+        try:
+            execute_options = self.get_execute_options(
+                request, variables, operation_name
+            )
+            execute_options["context_value"].is_async = True
+            with use_primary() if entry is not None else nullcontext():
+                result = execute(
+                    self.schema.graphql_schema, document, **execute_options
+                )
+                if isawaitable(result):
+                    result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        if entry is not None and not result.errors:
+            await sync_to_async(entry.store)(result.data)
+        return result
+
+
+def document_cache_stats(request):
+    return JsonResponse(document_cache.stats())
+
+
+def metrics_view(request):
+    cache = document_cache.stats()
+    responses = response_cache.response_stats.stats()
+    extra = [
+        "# TYPE graphql_document_cache_hits_total counter",
+        f"graphql_document_cache_hits_total {cache['hits']}",
+        "# TYPE graphql_document_cache_misses_total counter",
+        f"graphql_document_cache_misses_total {cache['misses']}",
+        "# TYPE graphql_response_cache_hits_total counter",
+        f"graphql_response_cache_hits_total {responses['hits']}",
+        "# TYPE graphql_response_cache_misses_total counter",
+        f"graphql_response_cache_misses_total {responses['misses']}",
+    ]
+    return HttpResponse(metrics.render(extra), content_type="text/plain; version=0.0.4")
+
+
+def export_allowed(request):
+    """Staff users, or callers sending ``Authorization: Bearer <CRM_EXPORT_TOKEN>``."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = setting("CRM_EXPORT_TOKEN", None)
+    header = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+
+
+def export_view(request, kind, fmt):
+    """Stream orders or customers, filtered by the query string."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if not export_allowed(request):
+        return HttpResponseForbidden("Exports require a staff user or token.")
+    try:
+        lines = exports.export(kind, fmt, request.GET)
+    except exports.ExportError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(lines, content_type=exports.CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    return response